@@ -1,17 +1,17 @@
-import gc
 import logging
 from collections import defaultdict
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, Dict, Iterable, List, Set
 
 import audioread
 import soundfile as sf
-import torch
 from whisper_model.config import WhisperXConfig
+from whisper_model.registry import MODEL_REGISTRY, RegistryKey
 from whisper_model.whisperx_model import (
     TranscriptionMetrics,
     TranscriptionResult,
     WhisperXModel,
+    config_registry_keys,
 )
 
 from .config import BenchmarkConfig, BenchmarkWhisperConfig
@@ -29,13 +29,16 @@ class Benchmark:
         self.analyzer = ResultsAnalyzer(config.results_path)
         self.gpu_monitor = GPUMonitor()
 
-    def _preload_models(self):
-        for whisper_config in self.config.whisper_configs:
-            base_whisper_config = whisper_config.model_dump(exclude={"config_name"})
-            self.transcriber = WhisperXModel(WhisperXConfig(**base_whisper_config))
-            gc.collect()
-            torch.cuda.empty_cache()
-            self.transcriber = None
+    def _registry_keys(self) -> List[Set[RegistryKey]]:
+        """Ключи моделей реестра для каждой конфигурации; модели не загружаются."""
+        return [
+            set(
+                config_registry_keys(
+                    WhisperXConfig(**whisper_config.model_dump(exclude={"config_name"}))
+                )
+            )
+            for whisper_config in self.config.whisper_configs
+        ]
 
     def _get_audio_files_with_transcriptions(self) -> Dict[Path, str]:
         if self.config.dataset:
@@ -64,7 +67,7 @@ class Benchmark:
     def run(self) -> Dict[str, Dict[str, Any]]:
         audio_paths_with_transcriptions = self._get_audio_files_with_transcriptions()
         results = {}
-        self._preload_models()
+        registry_keys = self._registry_keys()
 
         for i, whisper_config in enumerate(self.config.whisper_configs):
             base_whisper_config = whisper_config.model_dump(exclude={"config_name"})
@@ -74,16 +77,25 @@ class Benchmark:
                 f"Тестирование конфигурации {i + 1}/{len(self.config.whisper_configs)}: {config_name}"
             )
 
-            config_results = {"config": whisper_config.model_dump(), "files": {}}
+            config_results = {
+                "config": whisper_config.model_dump(),
+                "load_times": self.transcriber.load_times,
+                "files": {},
+            }
+            logger.info(f"Время загрузки моделей: {self.transcriber.load_times}")
 
             config_results["files"] = self._process_files(
                 audio_paths_with_transcriptions, whisper_config
             )
 
             self._save_result({config_name: config_results}, config_name)
+            used_keys = set(self.transcriber.registry_keys)
+            self.transcriber.close()
             self.transcriber = None
-            gc.collect()
-            torch.cuda.empty_cache()
+            # В реестре остаются только модели, общие со следующей конфигурацией
+            next_keys = registry_keys[i + 1] if i + 1 < len(registry_keys) else set()
+            for key in used_keys - next_keys:
+                MODEL_REGISTRY.unload(key)
 
             results[config_name] = config_results
 
@@ -155,6 +167,43 @@ class Benchmark:
 
                     results[file_name] = result
 
+        elif whisper_config.pipelined:
+            # --- КОНВЕЙЕРНАЯ ОБРАБОТКА ПО ОДНОМУ ФАЙЛУ ---
+            accumulated_metrics_per_file: Dict[str, List[TranscriptionMetrics]] = (
+                defaultdict(lambda: [])
+            )
+            last_run_results: Dict[str, TranscriptionResult] = {}
+
+            self.gpu_monitor.start()
+            for _ in range(self.config.repeat_count):
+                for item in self.transcriber.transcribe_many(
+                    audio_paths_with_transcriptions.keys()
+                ):
+                    if item.error or not item.result:
+                        raise ValueError(
+                            f"Не удалось получить результаты транскрипции {item.audio_path}: {item.error}"
+                        )
+                    file_name = item.audio_path.name
+                    accumulated_metrics_per_file[file_name].append(item.result.metrics)
+                    last_run_results[file_name] = item.result
+            gpu_stats_pipeline = self.gpu_monitor.stop()
+
+            for file_path, reference in audio_paths_with_transcriptions.items():
+                file_name = file_path.name
+                duration = self._get_audio_duration(file_path)
+                if duration <= 0:
+                    raise ValueError(
+                        f"Длительность аудиофайла {file_path} не может быть меньше или равна 0"
+                    )
+
+                results[file_name] = self._build_result(
+                    reference,
+                    last_run_results[file_name].text,
+                    duration,
+                    accumulated_metrics_per_file[file_name],
+                    gpu_stats_pipeline,
+                )
+
         else:
             # --- ОБРАБОТКА ПО ОДНОМУ ФАЙЛУ ---
             for file_path, reference in audio_paths_with_transcriptions.items():
@@ -204,6 +253,7 @@ class Benchmark:
     ):
         wer = word_error_rate(reference, hypothesis)
 
+        avg_decode = sum(metric.decode_time for metric in metrics) / len(metrics)
         # for each item in metrics, get the value of the key "transcribe_time"
         avg_transcribe = sum(metric.transcribe_time for metric in metrics) / len(
             metrics
@@ -212,12 +262,26 @@ class Benchmark:
         avg_segmentation = sum(metric.segmentation_time for metric in metrics) / len(
             metrics
         )
+        avg_wall = sum(metric.wall_time for metric in metrics) / len(metrics)
+        avg_aligned_fraction = sum(metric.aligned_fraction for metric in metrics) / len(
+            metrics
+        )
+        avg_saved_audio = sum(metric.saved_audio_s for metric in metrics) / len(metrics)
+        # Доля прогонов, в которых выравнивание было пропущено целиком
+        fast_path_rate = sum(metric.aligned_fraction == 0 for metric in metrics) / len(
+            metrics
+        )
 
         avg_metrics = {
+            "decode_time": avg_decode,
             "transcribe_time": avg_transcribe,
             "align_time": avg_align,
             "segmentation_time": avg_segmentation,
-            "total_processing_time": avg_transcribe + avg_align + avg_segmentation,
+            "total_processing_time": avg_decode
+            + avg_transcribe
+            + avg_align
+            + avg_segmentation,
+            "total_wall_time": avg_wall,
         }
 
         for metric_name, metric_value in avg_metrics.copy().items():
@@ -231,6 +295,9 @@ class Benchmark:
             "metrics": {
                 "duration": audio_duration,
                 "wer": wer,
+                "aligned_fraction": avg_aligned_fraction,
+                "fast_path": fast_path_rate,
+                "saved_audio_s": avg_saved_audio,
                 **avg_metrics,
                 **gpu_stats,
             },
@@ -12,6 +12,10 @@ class BenchmarkWhisperConfig(WhisperXConfig):
         ..., description="Имя конфигурации для формирования названий файлов"
     )
     audio_batch_size: int = Field(1, description="Количество файлов в одном батче")
+    pipelined: bool = Field(
+        False,
+        description="Обрабатывать файлы по одному через конвейер transcribe_many",
+    )
 
 
 class DatasetConfig(BaseModel):
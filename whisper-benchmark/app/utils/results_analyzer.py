@@ -92,6 +92,7 @@ class ResultsAnalyzer:
 
         avg_df = pd.DataFrame(avg_rows)
         file_df = pd.DataFrame(file_rows)
+        self._log_fast_path_stats(file_df)
 
         configs = [r["config"] for r in results.values()]
         base = "__".join([f"{c['config_name'] or 'unknown'}" for c in configs])
@@ -100,6 +101,21 @@ class ResultsAnalyzer:
         logger.info(f"CSV с результатами сохранен в {csv_path}")
         self._create_visualizations(avg_df, file_df)
 
+    def _log_fast_path_stats(self, file_df: pd.DataFrame) -> None:
+        """Доля файлов без выравнивания (adaptive режим) и WER по обеим группам."""
+        if "fast_path" not in file_df.columns:
+            return
+
+        for config_name, config_df in file_df.groupby("config_name"):
+            fast_path = config_df["fast_path"] == 1
+            fast_wer = config_df.loc[fast_path, "wer"].mean()
+            aligned_wer = config_df.loc[~fast_path, "wer"].mean()
+            logger.info(
+                f"{config_name}: без выравнивания {fast_path.mean():.1%} файлов, "
+                f"выровнено {config_df['aligned_fraction'].mean():.1%} сегментов; "
+                f"WER без выравнивания {fast_wer:.4f}, с выравниванием {aligned_wer:.4f}"
+            )
+
     def _make_histogram(
         self, df, metric, title, ylabel, filename, is_lower_better=True
     ):
@@ -222,7 +238,8 @@ class ResultsAnalyzer:
         time_cols = [
             col
             for col in avg_df.columns
-            if col.endswith("_time") and col not in ["total_processing_time"]
+            if col.endswith("_time")
+            and col not in ["total_processing_time", "total_wall_time"]
         ]
         if not time_cols:
             return
@@ -2,6 +2,7 @@ import ctypes
 import json
 import logging
 import os
+import sys
 
 from app import Benchmark, BenchmarkConfig
 
@@ -36,7 +37,8 @@ def main():
 
     prevent_sleep()
     try:
-        config = BenchmarkConfig(**json.load(open("config.json", "r", encoding="utf-8")))
+        config_path = sys.argv[1] if len(sys.argv) > 1 else "config.json"
+        config = BenchmarkConfig(**json.load(open(config_path, "r", encoding="utf-8")))
         benchmark = Benchmark(config)
         benchmark.run()
 
@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from typing import Dict, List
+
+from batch_task import BatchTask
+
+
+@dataclass
+class PlannedBatch:
+    tasks: List[BatchTask]
+    # Файл длиннее SINGLE_FILE_MAX_DURATION_S, обрабатывается отдельно
+    isolated: bool = False
+    lane: str = "batch"
+
+    @property
+    def oldest_sent_at(self) -> float:
+        return min(task.sent_at for task in self.tasks)
+
+    @property
+    def total_duration(self) -> float:
+        return sum(task.audio_duration for task in self.tasks)
+
+    def composition(self) -> Dict[str, float]:
+        durations = [task.audio_duration for task in self.tasks]
+        return {
+            "files": len(durations),
+            "total_duration_s": sum(durations),
+            "min_duration_s": min(durations),
+            "max_duration_s": max(durations),
+            "isolated": float(self.isolated),
+        }
+
+    def describe(self) -> str:
+        composition = self.composition()
+        kind = "отдельный файл" if self.isolated else f"батч ({self.lane})"
+        return (
+            f"{kind}: {len(self.tasks)} файлов, {composition['total_duration_s']:.1f}s, "
+            f"длительности {composition['min_duration_s']:.1f}-{composition['max_duration_s']:.1f}s"
+        )
+
+
+def is_oversized(task: BatchTask, single_file_max_duration_s: float) -> bool:
+    return task.audio_duration > single_file_max_duration_s
+
+
+def plan_batches(
+    tasks: List[BatchTask],
+    max_files: int,
+    max_total_duration_s: float,
+    single_file_max_duration_s: float,
+    lane: str = "batch",
+) -> List[PlannedBatch]:
+    """Раскладывает накопленные задачи по батчам.
+
+    Файлы длиннее single_file_max_duration_s идут отдельными батчами. Остальные
+    сортируются по длительности и набираются подряд, пока батч не упрется в
+    max_files или max_total_duration_s, поэтому в батче файлы близкой длины:
+    короткие голосовые не ждут в одном батче длинных. Батчи упорядочены по
+    самому старому сообщению в них.
+    """
+    batches = [
+        PlannedBatch([task], isolated=True, lane=lane)
+        for task in tasks
+        if is_oversized(task, single_file_max_duration_s)
+    ]
+
+    current: List[BatchTask] = []
+    current_duration = 0.0
+    regular = sorted(
+        (task for task in tasks if not is_oversized(task, single_file_max_duration_s)),
+        key=lambda task: task.audio_duration,
+    )
+    for task in regular:
+        if current and (len(current) >= max_files or current_duration + task.audio_duration > max_total_duration_s):
+            batches.append(PlannedBatch(current, lane=lane))
+            current, current_duration = [], 0.0
+        current.append(task)
+        current_duration += task.audio_duration
+    if current:
+        batches.append(PlannedBatch(current, lane=lane))
+
+    return sorted(batches, key=lambda batch: batch.oldest_sent_at)
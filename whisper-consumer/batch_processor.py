@@ -1,15 +1,41 @@
 import asyncio
+import itertools
 import logging
-from typing import Dict, List, Optional
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
+from batch_planner import PlannedBatch, is_oversized, plan_batches
 from batch_task import BatchTask
+from batch_window import BatchWindow
 from config import (
     BATCH_ACCUMULATION_TIME_S,
+    BATCH_LATENCY_P95_TARGET_S,
+    BATCH_MAX_FILES,
     BATCH_MAX_TOTAL_DURATION_S,
+    BATCH_PLANNER_POOL_BATCHES,
+    BATCH_WINDOW_EWMA_ALPHA,
+    BATCH_WINDOW_MAX_S,
+    BATCH_WINDOW_MIN_S,
+    BATCH_WINDOW_MODE,
+    FAST_LANE_MAX_DURATION_S,
+    FAST_LANE_WINDOW_MS,
+    SCHEDULING_SLA_S,
+    SINGLE_FILE_MAX_DURATION_S,
 )
 from transcription import send_result
 from whisper_model import TranscriptionResult, WhisperXModel
 
+FAST_LANE = "fast"
+BATCH_LANE = "batch"
+# Без SCHEDULING_SLA_S срок батча - самое старое сообщение плюс запас полосы: быстрая полоса
+# обгоняет обычные батчи, но не дольше BATCH_LATENCY_P95_TARGET_S, поэтому не вытесняет их совсем
+LANE_DEADLINE_S = {FAST_LANE: 0.0, BATCH_LANE: BATCH_LATENCY_P95_TARGET_S}
+# Задачи копятся на несколько батчей, и планировщик раскладывает их по длительности
+POOL_MAX_FILES = BATCH_MAX_FILES * BATCH_PLANNER_POOL_BATCHES
+POOL_MAX_TOTAL_DURATION_S = BATCH_MAX_TOTAL_DURATION_S * BATCH_PLANNER_POOL_BATCHES
+
 
 class BatchProcessor:
     def __init__(self, whisper_model: WhisperXModel, broker):
@@ -17,11 +43,53 @@ class BatchProcessor:
         self.broker = broker
         self.pending_tasks: List[BatchTask] = []
         self.batch_timer: Optional[asyncio.Task] = None
+        # Защищает только накопление батча: инференс идет вне блокировки
         self.lock = asyncio.Lock()
         self.batch_duration = 0.0
+        self.batch_started_at = 0.0
+        self.batch_window = BatchWindow(
+            mode=BATCH_WINDOW_MODE,
+            fixed_window_s=BATCH_ACCUMULATION_TIME_S,
+            min_window_s=BATCH_WINDOW_MIN_S,
+            max_window_s=BATCH_WINDOW_MAX_S,
+            p95_target_s=BATCH_LATENCY_P95_TARGET_S,
+            max_files=POOL_MAX_FILES,
+            alpha=BATCH_WINDOW_EWMA_ALPHA,
+        )
+
+        # Сформированные батчи ждут модель в очереди, а модель работает в отдельном потоке,
+        # чтобы цикл событий продолжал загружать файлы и собирать следующий батч
+        # Батчи всех полос забираются по самому раннему сроку (EDF), см. _batch_deadline
+        self.ready_batches: Optional[asyncio.PriorityQueue[Tuple[float, int, PlannedBatch]]] = None
+        self.batch_sequence = itertools.count()
+        self.inference_worker: Optional[asyncio.Task] = None
+        self.inference_busy = False
+        # Для оценки, через сколько освободится модель
+        self.queued_audio_s = 0.0
+        self.inference_audio_s = 0.0
+        self.inference_started_at = 0.0
+
+        # Короткие голосовые: на свободную модель микро-батчем через FAST_LANE_WINDOW_MS,
+        # на занятую - одним микро-батчем, как только она освободится
+        self.fast_tasks: List[BatchTask] = []
+        self.fast_timer: Optional[asyncio.Task] = None
+        self.inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper-inference")
 
     async def add_task(self, task: BatchTask):
+        if is_oversized(task, SINGLE_FILE_MAX_DURATION_S):
+            # Длинный файл не ждет накопления и не попадает в батч с короткими
+            self._submit_batch([task])
+            return
+        if FAST_LANE_MAX_DURATION_S and task.audio_duration <= FAST_LANE_MAX_DURATION_S:
+            await self._add_fast_task(task)
+            return
+
+        tasks_to_process = None
         async with self.lock:
+            now = time.monotonic()
+            self.batch_window.observe_arrival(now)
+            if not self.pending_tasks:
+                self.batch_started_at = now
             self.pending_tasks.append(task)
             self.batch_duration += task.audio_duration
 
@@ -29,21 +97,102 @@ class BatchProcessor:
                 f"Задача добавлена в батч. Размер батча: {len(self.pending_tasks)}, общая длительность: {self.batch_duration:.1f}s"
             )
 
-            if self.batch_duration >= BATCH_MAX_TOTAL_DURATION_S:
-                await self._process_current_batch()
-            elif self.batch_timer is None:
-                self.batch_timer = asyncio.create_task(self._batch_timer_task())
+            if len(self.pending_tasks) >= POOL_MAX_FILES or self.batch_duration >= POOL_MAX_TOTAL_DURATION_S:
+                tasks_to_process = self._take_current_batch()
+            elif self.batch_timer is None or self.batch_window.mode == "adaptive" or SCHEDULING_SLA_S:
+                # Адаптивное окно и срок самой старой задачи пересчитываются с каждой новой задачей
+                self._schedule_batch_timer(now)
+
+        if tasks_to_process:
+            self._submit_batch(tasks_to_process)
+
+    def _schedule_batch_timer(self, now: float):
+        """Ставит таймер отправки накопленного батча. Вызывается под self.lock."""
+        if self.batch_timer:
+            self.batch_timer.cancel()
+
+        backlog = self._model_backlog_s(now)
+        window = self.batch_window.window_s(len(self.pending_tasks), self.batch_duration, backlog)
+        flush_at = self.batch_started_at + window
+        if SCHEDULING_SLA_S:
+            flush_at = min(flush_at, self._latest_flush_at(now, backlog))
+        delay = max(0.0, flush_at - now)
+        logging.info(f"Батч будет отправлен через {delay:.1f}s (окно {window:.1f}s, {self.batch_window.stats()})")
+        self.batch_timer = asyncio.create_task(self._batch_timer_task(delay))
+
+    def _latest_flush_at(self, now: float, backlog: float) -> float:
+        """Когда отправить батч, чтобы задачи получили результат в SCHEDULING_SLA_S. Вызывается под self.lock.
+
+        Если срок самой старой задачи уже прошел, батч уходит сразу. Иначе отправка
+        подстраивается под самый ранний срок, который еще можно успеть: задачи, чей
+        срок не успеть и при немедленной отправке, не отключают раннюю отправку остальных.
+        """
+        deadlines = [task.deadline(SCHEDULING_SLA_S) for task in self.pending_tasks]
+        if min(deadlines) <= now:
+            return now
+
+        service = self.batch_window.predict_service_s(self.batch_duration)
+        meetable = [deadline - backlog - service for deadline in deadlines if deadline - backlog - service >= now]
+        return min(meetable, default=math.inf)
 
-    async def _batch_timer_task(self):
-        await asyncio.sleep(BATCH_ACCUMULATION_TIME_S)
+    def _model_backlog_s(self, now: float) -> float:
+        """Оценка времени до освобождения модели: очередь и остаток текущего батча."""
+        backlog = self.batch_window.predict_service_s(self.queued_audio_s)
+        if self.inference_busy:
+            in_flight = self.batch_window.predict_service_s(self.inference_audio_s)
+            backlog += max(0.0, in_flight - (now - self.inference_started_at))
+        return backlog
+
+    async def _batch_timer_task(self, delay: float):
+        await asyncio.sleep(delay)
         async with self.lock:
-            if self.pending_tasks:
-                await self._process_current_batch()
+            # Таймер завершается сам, отменять его при сборе батча не нужно
+            self.batch_timer = None
+            tasks_to_process = self._take_current_batch()
 
-    async def _process_current_batch(self):
-        if not self.pending_tasks:
-            return
+        if tasks_to_process:
+            self._submit_batch(tasks_to_process)
+
+    async def _add_fast_task(self, task: BatchTask):
+        task.lane = FAST_LANE
+        tasks_to_process = None
+        async with self.lock:
+            self.fast_tasks.append(task)
+            if self._model_idle() and not FAST_LANE_WINDOW_MS:
+                tasks_to_process = self._take_fast_tasks()
+            elif self._model_idle() and self.fast_timer is None:
+                # Свободная модель ждет FAST_LANE_WINDOW_MS, чтобы собрать микро-батч;
+                # пока модель занята, задачи заберет _inference_loop
+                self.fast_timer = asyncio.create_task(self._fast_timer_task())
+
+        if tasks_to_process:
+            self._submit_batch(tasks_to_process, FAST_LANE)
+
+    async def _fast_timer_task(self):
+        await asyncio.sleep(FAST_LANE_WINDOW_MS / 1000)
+        async with self.lock:
+            self.fast_timer = None
+            # Пока модель занята, микро-батч продолжает копиться: его заберет _inference_loop
+            tasks_to_process = self._take_fast_tasks() if self._model_idle() else None
+
+        if tasks_to_process:
+            self._submit_batch(tasks_to_process, FAST_LANE)
 
+    def _take_fast_tasks(self) -> List[BatchTask]:
+        """Забирает задачи быстрой полосы. Вызывается под self.lock."""
+        if self.fast_timer:
+            self.fast_timer.cancel()
+            self.fast_timer = None
+
+        tasks_to_process = self.fast_tasks.copy()
+        self.fast_tasks.clear()
+        return tasks_to_process
+
+    def _model_idle(self) -> bool:
+        return not self.inference_busy and (self.ready_batches is None or self.ready_batches.empty())
+
+    def _take_current_batch(self) -> List[BatchTask]:
+        """Забирает накопленные задачи. Вызывается под self.lock."""
         if self.batch_timer:
             self.batch_timer.cancel()
             self.batch_timer = None
@@ -51,17 +200,81 @@ class BatchProcessor:
         tasks_to_process = self.pending_tasks.copy()
         self.pending_tasks.clear()
         self.batch_duration = 0.0
+        return tasks_to_process
+
+    def _submit_batch(self, tasks: List[BatchTask], lane: str = BATCH_LANE):
+        if self.ready_batches is None:
+            self.ready_batches = asyncio.PriorityQueue()
+        if self.inference_worker is None or self.inference_worker.done():
+            self.inference_worker = asyncio.create_task(self._inference_loop())
 
-        logging.info(f"Начинаю обработку батча из {len(tasks_to_process)} задач")
-        await self._process_batch_tasks(tasks_to_process)
+        for planned_batch in plan_batches(
+            tasks, BATCH_MAX_FILES, BATCH_MAX_TOTAL_DURATION_S, SINGLE_FILE_MAX_DURATION_S, lane
+        ):
+            self.ready_batches.put_nowait(
+                (self._batch_deadline(planned_batch), next(self.batch_sequence), planned_batch)
+            )
+            self.queued_audio_s += planned_batch.total_duration
+            logging.info(
+                f"На инференс передан {planned_batch.describe()}. Батчей в очереди: {self.ready_batches.qsize()}"
+            )
+
+    def _batch_deadline(self, planned_batch: PlannedBatch) -> float:
+        if SCHEDULING_SLA_S:
+            return planned_batch.oldest_sent_at + SCHEDULING_SLA_S
+        return planned_batch.oldest_sent_at + LANE_DEADLINE_S[planned_batch.lane]
+
+    async def _inference_loop(self):
+        assert self.ready_batches is not None
+        while True:
+            async with self.lock:
+                fast_tasks = self._take_fast_tasks()
+            if fast_tasks:
+                # Короткие голосовые, пришедшие за время прошлого батча, идут следующими
+                self._submit_batch(fast_tasks, FAST_LANE)
 
-    async def _process_batch_tasks(self, tasks: List[BatchTask]):
+            *_, planned_batch = await self.ready_batches.get()
+            self.queued_audio_s = max(0.0, self.queued_audio_s - planned_batch.total_duration)
+            self.inference_busy = True
+            self.inference_audio_s = planned_batch.total_duration
+            self.inference_started_at = time.monotonic()
+            for task in planned_batch.tasks:
+                task.scheduling_delay_s = self.inference_started_at - task.received_at
+            try:
+                logging.info(f"Начинаю обработку: {planned_batch.describe()}")
+                await self._process_batch_tasks(planned_batch)
+            except Exception as e:
+                logging.exception(f"Ошибка обработки батча: {e}")
+            finally:
+                self.inference_busy = False
+                self.ready_batches.task_done()
+
+    async def _process_batch_tasks(self, planned_batch: PlannedBatch):
+        tasks = planned_batch.tasks
         audio_files = [task.file_path for task in tasks]
         batch_results: Dict[str, TranscriptionResult] = {}
 
         try:
             logging.info(f"Начинаю пакетную транскрипцию {len(audio_files)} файлов")
-            batch_results = self.whisper_model.transcribe_batch(audio_files)
+            start = time.monotonic()
+            batch_results = await asyncio.get_running_loop().run_in_executor(
+                self.inference_executor, self.whisper_model.transcribe_batch, audio_files
+            )
+            inference_time = time.monotonic() - start
+            self.batch_window.observe_service(planned_batch.total_duration, inference_time)
+            batch_metrics = {
+                **planned_batch.composition(),
+                "lane": planned_batch.lane,
+                "inference_time_s": inference_time,
+                "max_scheduling_delay_s": max(task.scheduling_delay_s or 0.0 for task in tasks),
+            }
+            if SCHEDULING_SLA_S:
+                finished_at = time.monotonic()
+                batch_metrics["missed_deadlines"] = sum(finished_at > task.deadline(SCHEDULING_SLA_S) for task in tasks)
+            logging.info(f"Метрики батча: {batch_metrics}")
+            cache_stats = self.whisper_model.cache_stats
+            if cache_stats:
+                logging.info(f"Статистика кэша транскрипций: {cache_stats.to_dict()}")
 
         except Exception as e:
             logging.exception(f"Ошибка при пакетной обработке: {e}")
@@ -81,7 +294,10 @@ class BatchProcessor:
             file_name = task.file_path.name
             result_text = batch_results[file_name].text
             send_tasks.append(send_result(self.broker, task.chat_id, result_text, None))
-            logging.info(f"Результат подготовлен для отправки chat_id: {task.chat_id}")
+            logging.info(
+                f"Результат подготовлен для отправки chat_id: {task.chat_id}, полоса: {task.lane}, "
+                f"возраст сообщения при получении: {task.initial_age_s:.1f}s, ожидание инференса: {task.scheduling_delay_s:.1f}s"
+            )
 
         await asyncio.gather(*send_tasks)
         logging.info(f"Все результаты отправлены для {len(tasks)} задач")
@@ -1,5 +1,19 @@
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
+
+
+def message_age_s(message_date: str) -> float:
+    """Возраст сообщения по message_date (ISO) от бэкенда; 0, если дату не разобрать."""
+    try:
+        sent_at = datetime.fromisoformat(message_date)
+    except (TypeError, ValueError):
+        return 0.0
+    if sent_at.tzinfo is None:
+        sent_at = sent_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (datetime.now(timezone.utc) - sent_at).total_seconds())
 
 
 @dataclass
@@ -8,3 +22,21 @@ class BatchTask:
     chat_id: int
     message_date: str
     audio_duration: float
+    # Полоса, по которой задача попала на инференс: fast или batch
+    lane: str = "batch"
+    # time.monotonic() создания задачи и возраст сообщения в этот момент
+    received_at: float = field(default_factory=time.monotonic)
+    initial_age_s: float = field(init=False)
+    # От получения задачи до начала ее инференса
+    scheduling_delay_s: Optional[float] = None
+
+    def __post_init__(self):
+        self.initial_age_s = message_age_s(self.message_date)
+
+    @property
+    def sent_at(self) -> float:
+        """Момент отправки сообщения в шкале time.monotonic()."""
+        return self.received_at - self.initial_age_s
+
+    def deadline(self, sla_s: float) -> float:
+        return self.sent_at + sla_s
@@ -0,0 +1,89 @@
+from typing import Optional
+
+
+class BatchWindow:
+    """Окно накопления батча.
+
+    fixed - всегда fixed_window_s. adaptive - окно выбирается по скользящим
+    средним (EWMA) интервала между задачами и времени инференса на секунду
+    аудио: ждать есть смысл, только пока ожидаются новые задачи и ожидание
+    укладывается в цель по p95 задержки; пока модель занята, ждать бесплатно.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        fixed_window_s: float,
+        min_window_s: float,
+        max_window_s: float,
+        p95_target_s: float,
+        max_files: int,
+        alpha: float,
+    ):
+        self.mode = mode
+        self.fixed_window_s = fixed_window_s
+        self.min_window_s = min_window_s
+        self.max_window_s = max_window_s
+        self.p95_target_s = p95_target_s
+        self.max_files = max_files
+        self.alpha = alpha
+
+        self.last_arrival: Optional[float] = None
+        self.arrival_interval_s: Optional[float] = None
+        # Секунд инференса на секунду аудио и среднее отклонение от него
+        self.service_rate: Optional[float] = None
+        self.service_rate_deviation = 0.0
+
+    def _ewma(self, average: Optional[float], value: float) -> float:
+        return value if average is None else self.alpha * value + (1 - self.alpha) * average
+
+    def observe_arrival(self, now: float):
+        if self.last_arrival is not None:
+            self.arrival_interval_s = self._ewma(self.arrival_interval_s, now - self.last_arrival)
+        self.last_arrival = now
+
+    def observe_service(self, audio_duration_s: float, service_time_s: float):
+        if audio_duration_s <= 0:
+            return
+        rate = service_time_s / audio_duration_s
+        if self.service_rate is not None:
+            self.service_rate_deviation = self._ewma(self.service_rate_deviation, abs(rate - self.service_rate))
+        self.service_rate = self._ewma(self.service_rate, rate)
+
+    def predict_service_s(self, audio_duration_s: float, p95: bool = False) -> float:
+        if self.service_rate is None:
+            return 0.0
+        # Около двух отклонений сверху среднего - оценка 95-го перцентиля
+        rate = self.service_rate + (2 * self.service_rate_deviation if p95 else 0.0)
+        return rate * audio_duration_s
+
+    def window_s(self, pending_files: int, pending_duration_s: float, backlog_s: float) -> float:
+        """Сколько ждать от первой задачи батча до его отправки на модель.
+
+        backlog_s - оценка времени, через которое модель освободится.
+        """
+        if self.mode == "fixed":
+            return self.fixed_window_s
+
+        # Дольше ждать нельзя: первая задача батча не уложится в цель по p95
+        budget = self.p95_target_s - backlog_s - self.predict_service_s(pending_duration_s, p95=True)
+        budget = min(max(budget, self.min_window_s), self.max_window_s)
+        if self.arrival_interval_s is None:
+            return min(self.fixed_window_s, budget)
+
+        arrival_rate = 1 / max(self.arrival_interval_s, 1e-3)
+        if backlog_s <= 0 and arrival_rate * budget < 1:
+            # За все допустимое ожидание новых задач не ожидается
+            return self.min_window_s
+
+        fill_time = max(0, self.max_files - pending_files) / arrival_rate
+        window = max(fill_time, backlog_s)
+        return min(max(window, self.min_window_s), budget)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "arrival_interval_s": self.arrival_interval_s,
+            "service_rate": self.service_rate,
+            "service_rate_deviation": self.service_rate_deviation,
+        }
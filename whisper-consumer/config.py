@@ -8,7 +8,22 @@ WHISPER_CONFIG_JSON_PATH = os.getenv("WHISPER_CONFIG_JSON_PATH")
 BATCH_ACCUMULATION_TIME_S = int(os.getenv("BATCH_ACCUMULATION_TIME_S", "45"))
 BATCH_MAX_TOTAL_DURATION_S = int(os.getenv("BATCH_MAX_TOTAL_DURATION_S", "1800"))
 BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "6"))
-SINGLE_FILE_MAX_DURATION_S = 60
+# Сколько батчей копится перед планированием, чтобы было из чего группировать файлы по длительности
+BATCH_PLANNER_POOL_BATCHES = int(os.getenv("BATCH_PLANNER_POOL_BATCHES", "3"))
+# fixed - окно BATCH_ACCUMULATION_TIME_S, adaptive - окно по частоте задач и времени инференса
+BATCH_WINDOW_MODE = os.getenv("BATCH_WINDOW_MODE", "fixed")
+BATCH_LATENCY_P95_TARGET_S = float(os.getenv("BATCH_LATENCY_P95_TARGET_S", "60"))
+BATCH_WINDOW_MIN_S = float(os.getenv("BATCH_WINDOW_MIN_S", "0.5"))
+BATCH_WINDOW_MAX_S = float(os.getenv("BATCH_WINDOW_MAX_S", str(BATCH_ACCUMULATION_TIME_S)))
+BATCH_WINDOW_EWMA_ALPHA = float(os.getenv("BATCH_WINDOW_EWMA_ALPHA", "0.2"))
+# Голосовые не длиннее идут в быструю полосу без окна накопления; 0 - выключено
+FAST_LANE_MAX_DURATION_S = float(os.getenv("FAST_LANE_MAX_DURATION_S", "0"))
+# Сколько свободная модель ждет другие короткие голосовые для микро-батча; 0 - отправлять сразу
+FAST_LANE_WINDOW_MS = int(os.getenv("FAST_LANE_WINDOW_MS", "50"))
+# Срок от отправки сообщения (message_date) до готовой транскрипции; 0 - без сроков
+SCHEDULING_SLA_S = float(os.getenv("SCHEDULING_SLA_S", "0"))
+# Файлы длиннее обрабатываются отдельными батчами
+SINGLE_FILE_MAX_DURATION_S = int(os.getenv("SINGLE_FILE_MAX_DURATION_S", "60"))
 
 if not TASK_QUEUE_NAME or not RESULTS_QUEUE_NAME:
     raise ValueError(
@@ -16,5 +31,11 @@ if not TASK_QUEUE_NAME or not RESULTS_QUEUE_NAME:
         f" Текущие значения: {TASK_QUEUE_NAME=}, {RESULTS_QUEUE_NAME=}"
     )
 
+if BATCH_WINDOW_MODE not in ("fixed", "adaptive"):
+    raise ValueError(f"BATCH_WINDOW_MODE должен быть fixed или adaptive. Текущее значение: {BATCH_WINDOW_MODE=}")
+
+if BATCH_PLANNER_POOL_BATCHES < 1:
+    raise ValueError(f"BATCH_PLANNER_POOL_BATCHES должен быть не меньше 1. Текущее значение: {BATCH_PLANNER_POOL_BATCHES=}")
+
 if not WHISPER_CONFIG_JSON_PATH:
     raise ValueError("Переменная окружения WHISPER_CONFIG_JSON_PATH должна быть установлена и указывать на JSON файл конфигурации.")
@@ -0,0 +1,115 @@
+import pytest
+
+from batch_planner import plan_batches
+from batch_task import BatchTask
+
+MAX_FILES = 4
+MAX_TOTAL_DURATION_S = 100.0
+SINGLE_FILE_MAX_DURATION_S = 60.0
+
+
+def make_task(audio_duration, received_at=0.0, name=None):
+    """Задача без даты сообщения: sent_at совпадает с received_at."""
+    return BatchTask(
+        file_path=name or f"{audio_duration}.oga",
+        chat_id=1,
+        message_date="",
+        audio_duration=audio_duration,
+        received_at=received_at,
+    )
+
+
+def plan(tasks, max_files=MAX_FILES, max_total_duration_s=MAX_TOTAL_DURATION_S):
+    return plan_batches(tasks, max_files, max_total_duration_s, SINGLE_FILE_MAX_DURATION_S)
+
+
+def durations(batch):
+    return [task.audio_duration for task in batch.tasks]
+
+
+def test_oversized_files_go_to_isolated_batches():
+    tasks = [make_task(5), make_task(90, received_at=1), make_task(61, received_at=2), make_task(60)]
+
+    batches = plan(tasks)
+
+    isolated = [batch for batch in batches if batch.isolated]
+    assert sorted(durations(batch)[0] for batch in isolated) == [61, 90]
+    assert all(len(batch.tasks) == 1 for batch in isolated)
+    # Ровно SINGLE_FILE_MAX_DURATION_S - еще обычный файл
+    regular = [batch for batch in batches if not batch.isolated]
+    assert [durations(batch) for batch in regular] == [[5, 60]]
+
+
+def test_batches_respect_file_count_limit():
+    tasks = [make_task(1) for _ in range(10)]
+
+    batches = plan(tasks)
+
+    assert [len(batch.tasks) for batch in batches] == [4, 4, 2]
+
+
+def test_batches_respect_total_duration_limit():
+    tasks = [make_task(duration) for duration in (30, 30, 30, 30, 50, 50)]
+
+    batches = plan(tasks)
+
+    assert sorted(durations(batch) for batch in batches) == [[30, 30, 30], [30, 50], [50]]
+    assert all(batch.total_duration <= MAX_TOTAL_DURATION_S for batch in batches)
+
+
+def test_single_file_above_total_limit_still_gets_a_batch():
+    batches = plan([make_task(50)], max_total_duration_s=10)
+
+    assert [durations(batch) for batch in batches] == [[50]]
+    assert not batches[0].isolated
+
+
+def test_files_of_similar_duration_share_a_batch():
+    tasks = [make_task(duration) for duration in (40, 2, 35, 3, 1, 45, 4, 30)]
+
+    batches = plan(tasks, max_total_duration_s=1000)
+
+    assert sorted(durations(batch) for batch in batches) == [[1, 2, 3, 4], [30, 35, 40, 45]]
+
+
+@pytest.mark.parametrize("pool_batches", [1, 3])
+def test_full_pool_splits_into_capped_batches(pool_batches):
+    # batch_processor копит до BATCH_MAX_FILES * BATCH_PLANNER_POOL_BATCHES задач
+    tasks = [make_task(float(i % 7 + 1), received_at=i) for i in range(MAX_FILES * pool_batches)]
+
+    batches = plan(tasks, max_total_duration_s=1000)
+
+    assert len(batches) == pool_batches
+    assert all(len(batch.tasks) == MAX_FILES for batch in batches)
+    assert sorted(task.file_path for batch in batches for task in batch.tasks) == sorted(
+        task.file_path for task in tasks
+    )
+
+
+def test_batches_ordered_by_oldest_message():
+    tasks = [
+        make_task(50, received_at=5),
+        make_task(1, received_at=3),
+        make_task(90, received_at=4),
+        make_task(2, received_at=1),
+        make_task(45, received_at=2),
+    ]
+
+    batches = plan(tasks, max_files=2)
+
+    assert [batch.oldest_sent_at for batch in batches] == [1, 2, 4]
+    assert [durations(batch) for batch in batches] == [[1, 2], [45, 50], [90]]
+    assert [batch.lane for batch in batches] == ["batch"] * 3
+
+
+def test_oldest_sent_at_uses_message_age():
+    task = BatchTask(
+        file_path="a.oga",
+        chat_id=1,
+        message_date="2000-01-01T00:00:00+00:00",
+        audio_duration=1,
+        received_at=100.0,
+    )
+
+    assert task.initial_age_s > 0
+    assert plan([task, make_task(2, received_at=50)])[0].oldest_sent_at == pytest.approx(task.sent_at)
@@ -0,0 +1,116 @@
+import pytest
+
+from batch_window import BatchWindow
+
+
+def make_window(mode="adaptive", **overrides):
+    params = dict(
+        fixed_window_s=2.0,
+        min_window_s=0.5,
+        max_window_s=10.0,
+        p95_target_s=30.0,
+        max_files=4,
+        alpha=0.5,
+    )
+    params.update(overrides)
+    return BatchWindow(mode, **params)
+
+
+def with_arrivals(window, *times):
+    for now in times:
+        window.observe_arrival(now)
+    return window
+
+
+def test_arrival_interval_ewma():
+    window = make_window()
+
+    window.observe_arrival(0.0)
+    assert window.arrival_interval_s is None
+    window.observe_arrival(1.0)
+    assert window.arrival_interval_s == pytest.approx(1.0)
+    window.observe_arrival(3.0)
+    assert window.arrival_interval_s == pytest.approx(0.5 * 2.0 + 0.5 * 1.0)
+
+
+def test_service_rate_ewma_and_deviation():
+    window = make_window()
+
+    window.observe_service(10.0, 5.0)
+    assert window.service_rate == pytest.approx(0.5)
+    assert window.service_rate_deviation == 0.0
+    window.observe_service(10.0, 10.0)
+    # Отклонение считается от среднего до обновления
+    assert window.service_rate_deviation == pytest.approx(0.25)
+    assert window.service_rate == pytest.approx(0.75)
+    # Пустое аудио не меняет оценку
+    window.observe_service(0.0, 5.0)
+    assert window.service_rate == pytest.approx(0.75)
+
+
+def test_predict_service_s():
+    window = make_window()
+    assert window.predict_service_s(10.0) == 0.0
+    assert window.predict_service_s(10.0, p95=True) == 0.0
+
+    window.observe_service(10.0, 5.0)
+    window.observe_service(10.0, 10.0)
+
+    assert window.predict_service_s(4.0) == pytest.approx(0.75 * 4)
+    assert window.predict_service_s(4.0, p95=True) == pytest.approx((0.75 + 2 * 0.25) * 4)
+
+
+def test_fixed_mode_ignores_estimates():
+    window = with_arrivals(make_window("fixed"), 0.0, 100.0)
+    window.observe_service(10.0, 100.0)
+
+    assert window.window_s(0, 0.0, 0.0) == 2.0
+    assert window.window_s(3, 50.0, 100.0) == 2.0
+
+
+@pytest.mark.parametrize(
+    "backlog_s, expected",
+    [
+        (0.0, 2.0),  # без интервалов - fixed_window_s
+        (29.0, 1.0),  # бюджет по p95 меньше fixed_window_s
+        (100.0, 0.5),  # бюджет исчерпан - не меньше min_window_s
+    ],
+)
+def test_adaptive_without_arrivals(backlog_s, expected):
+    assert make_window().window_s(1, 5.0, backlog_s) == pytest.approx(expected)
+
+
+def test_adaptive_sparse_arrivals_send_at_min_window():
+    window = with_arrivals(make_window(), 0.0, 20.0)
+
+    assert window.window_s(1, 5.0, 0.0) == pytest.approx(0.5)
+
+
+def test_adaptive_waits_to_fill_batch():
+    window = with_arrivals(make_window(), 0.0, 1.0)
+
+    # До max_files не хватает трех задач, по одной в секунду
+    assert window.window_s(1, 5.0, 0.0) == pytest.approx(3.0)
+    # Батч уже полный - ждать нечего
+    assert window.window_s(4, 5.0, 0.0) == pytest.approx(0.5)
+
+
+def test_adaptive_waits_while_model_is_busy():
+    window = with_arrivals(make_window(), 0.0, 1.0)
+
+    assert window.window_s(4, 5.0, 3.0) == pytest.approx(3.0)
+
+
+def test_adaptive_window_clamped_by_max_window():
+    window = with_arrivals(make_window(), 0.0, 5.0)
+
+    assert window.window_s(1, 5.0, 0.0) == pytest.approx(10.0)
+
+
+def test_adaptive_window_clamped_by_p95_budget():
+    window = with_arrivals(make_window(), 0.0, 5.0)
+    window.observe_service(10.0, 10.0)
+
+    # 30s цели - 25s инференса уже накопленного аудио
+    assert window.window_s(1, 25.0, 0.0) == pytest.approx(5.0)
+    assert window.window_s(1, 25.0, 3.0) == pytest.approx(2.0)
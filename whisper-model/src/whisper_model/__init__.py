@@ -1,4 +1,59 @@
+import importlib
+import logging
+import time
+from typing import TYPE_CHECKING, Dict
+
 from .config import TranscribeOptions, WhisperXConfig
-from .whisperx_model import TranscriptionResult, WhisperXModel
 
-__all__ = ["WhisperXModel", "WhisperXConfig", "TranscribeOptions", "TranscriptionResult"]
+if TYPE_CHECKING:
+    from .cache import CacheStats
+    from .whisperx_model import (
+        FileTranscription,
+        TranscriptionChunk,
+        TranscriptionResult,
+        WhisperXModel,
+    )
+
+__all__ = [
+    "WhisperXModel",
+    "WhisperXConfig",
+    "TranscribeOptions",
+    "TranscriptionResult",
+    "CacheStats",
+    "FileTranscription",
+    "TranscriptionChunk",
+]
+
+logger = logging.getLogger("whisper-model")
+
+# whisperx, pyannote и torch импортируются при первом обращении к модели,
+# а не при `import whisper_model`
+_LAZY_IMPORTS = {
+    "CacheStats": ".cache",
+    "WhisperXModel": ".whisperx_model",
+    "TranscriptionResult": ".whisperx_model",
+    "FileTranscription": ".whisperx_model",
+    "TranscriptionChunk": ".whisperx_model",
+}
+
+IMPORT_TIMES: Dict[str, float] = {}
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    if module_name not in IMPORT_TIMES:
+        start = time.monotonic()
+        module = importlib.import_module(module_name, __name__)
+        IMPORT_TIMES[module_name] = time.monotonic() - start
+        logger.info(
+            f"Модуль whisper_model{module_name} импортирован за {IMPORT_TIMES[module_name]:.2f}s"
+        )
+    else:
+        module = importlib.import_module(module_name, __name__)
+
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,466 @@
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import torch
+import whisperx
+
+from .audio import SAMPLE_RATE
+from .config import AlignConfig
+from .loading import LazyResource
+from .registry import MODEL_REGISTRY, RegistryKey, registry_key
+from .suppress_std import SuppressStd
+
+logger = logging.getLogger("whisper-model")
+
+Aligner = Tuple[Any, Dict[str, Any]]
+
+# Как в whisperx: для этих языков словом считается каждый символ
+LANGUAGES_WITHOUT_SPACES = {"ja", "zh"}
+# Минимальная длина входа wav2vec2 в сэмплах
+MIN_ALIGN_SAMPLES = 400
+# Сверточный feature extractor wav2vec2: (ядро, шаг) каждого слоя
+_WAV2VEC2_CONV_LAYERS = ((10, 5),) + ((3, 2),) * 4 + ((2, 2),) * 2
+
+
+class AlignerPool:
+    """Модели выравнивания wav2vec2 по языку.
+
+    Модель для языка загружается при первом обращении (через реестр процесса),
+    загруженных моделей не больше align_config.max_loaded_models: при
+    превышении выгружается давно не использованная. Для языка без модели
+    выравнивания используется модель language_code из конфигурации.
+    """
+
+    def __init__(self, align_config: AlignConfig):
+        self.align_config = align_config
+        self._aligners: OrderedDict[str, LazyResource[Aligner]] = OrderedDict()
+        self._keys: Dict[str, RegistryKey] = {}
+        self._unsupported: set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def loaded_languages(self) -> list[str]:
+        with self._lock:
+            return [
+                language
+                for language, aligner in self._aligners.items()
+                if aligner.ready
+            ]
+
+    def get(self, language_code: str | None = None) -> Aligner:
+        default_language = self.align_config.language_code
+        if not self.align_config.language_routing or not language_code:
+            language_code = default_language
+        if language_code in self._unsupported:
+            language_code = default_language
+
+        try:
+            return self._get(language_code)
+        except Exception as e:
+            if language_code == default_language:
+                raise
+            logger.warning(
+                f"Нет модели выравнивания для языка {language_code}, используется {default_language}: {e}"
+            )
+            with self._lock:
+                self._unsupported.add(language_code)
+            return self._get(default_language)
+
+    @property
+    def registry_keys(self) -> list[RegistryKey]:
+        with self._lock:
+            return list(self._keys.values())
+
+    def close(self) -> None:
+        with self._lock:
+            keys = list(self._keys.values())
+            self._aligners.clear()
+            self._keys.clear()
+        for key in keys:
+            MODEL_REGISTRY.release(key)
+
+    def _model_name(self, language_code: str) -> str | None:
+        if language_code in self.align_config.model_names:
+            return self.align_config.model_names[language_code]
+        if language_code == self.align_config.language_code:
+            return self.align_config.model_name
+        return None
+
+    def _get(self, language_code: str) -> Aligner:
+        with self._lock:
+            aligner = self._aligners.get(language_code)
+            if aligner is None:
+                aligner = LazyResource(
+                    f"align-{language_code}",
+                    lambda: self._acquire(language_code),
+                )
+                self._aligners[language_code] = aligner
+            self._aligners.move_to_end(language_code)
+
+        try:
+            model = aligner.get()
+        except Exception:
+            with self._lock:
+                if self._aligners.get(language_code) is aligner:
+                    del self._aligners[language_code]
+            raise
+
+        self._evict_over_limit(keep=language_code)
+        return model
+
+    def _align_kwargs(self, language_code: str) -> Dict[str, Any]:
+        return {
+            "language_code": language_code,
+            "device": self.align_config.device,
+            "model_name": self._model_name(language_code),
+        }
+
+    def registry_key(self, language_code: str) -> RegistryKey:
+        return registry_key("align", self._align_kwargs(language_code))
+
+    def _acquire(self, language_code: str) -> Aligner:
+        align_kwargs = self._align_kwargs(language_code)
+        key = registry_key("align", align_kwargs)
+        aligner = MODEL_REGISTRY.acquire(key, lambda: self._load(align_kwargs))
+        with self._lock:
+            self._keys[language_code] = key
+        return aligner
+
+    @staticmethod
+    def _load(align_kwargs: Dict[str, Any]) -> Aligner:
+        with SuppressStd(logger):
+            align_model, metadata = whisperx.load_align_model(**align_kwargs)
+        logger.info(
+            f"WhisperX Align model {align_kwargs['model_name'] or 'default'} loaded with config: {align_kwargs}"
+        )
+        return align_model, metadata
+
+    def _evict_over_limit(self, keep: str) -> None:
+        released = []
+        with self._lock:
+            for language_code in list(self._aligners):
+                if len(self._aligners) <= self.align_config.max_loaded_models:
+                    break
+                if language_code == keep or language_code not in self._keys:
+                    continue
+                del self._aligners[language_code]
+                released.append(self._keys.pop(language_code))
+                logger.info(f"Модель выравнивания {language_code} выгружена из пула")
+
+        for key in released:
+            MODEL_REGISTRY.release(key, unload=True)
+
+
+@dataclass
+class _SegmentTokens:
+    index: int
+    start_sample: int
+    end_sample: int
+    tokens: np.ndarray
+    # Позиция в тексте сегмента для каждого токена
+    char_index: np.ndarray
+
+
+def _num_frames(num_samples: np.ndarray) -> np.ndarray:
+    """Число кадров эмиссии wav2vec2 для входа из num_samples сэмплов."""
+    frames = num_samples
+    for kernel, stride in _WAV2VEC2_CONV_LAYERS:
+        frames = (frames - kernel) // stride + 1
+    return np.maximum(frames, 1)
+
+
+def _blank_id(dictionary: Dict[str, int]) -> int:
+    for char, code in dictionary.items():
+        if char in ("[pad]", "<pad>"):
+            return code
+    return 0
+
+
+def _tokenize(
+    index: int,
+    segment: Dict[str, Any],
+    dictionary: Dict[str, int],
+    language: str,
+    num_samples: int,
+) -> _SegmentTokens | None:
+    text = segment["text"]
+    start_sample = int(segment["start"] * SAMPLE_RATE)
+    end_sample = min(int(segment["end"] * SAMPLE_RATE), num_samples)
+    if start_sample >= num_samples:
+        return None
+
+    text_start = len(text) - len(text.lstrip())
+    text_end = len(text.rstrip())
+    tokens: List[int] = []
+    char_index: List[int] = []
+    for cdx in range(text_start, text_end):
+        char = text[cdx].lower()
+        if language not in LANGUAGES_WITHOUT_SPACES:
+            char = char.replace(" ", "|")
+        if char in dictionary:
+            tokens.append(dictionary[char])
+            char_index.append(cdx)
+    if not tokens:
+        return None
+
+    return _SegmentTokens(
+        index=index,
+        start_sample=start_sample,
+        end_sample=end_sample,
+        tokens=np.array(tokens, dtype=np.int64),
+        char_index=np.array(char_index, dtype=np.int64),
+    )
+
+
+def _emissions(
+    model: Any,
+    model_type: str,
+    waveforms: List[np.ndarray],
+    device: str,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Log-вероятности символов для батча срезов одним проходом модели.
+
+    Срезы дополняются нулями до самого длинного; возвращает эмиссии
+    (B, T, C) и число значимых кадров каждого среза.
+    """
+    lengths = np.array([max(len(w), MIN_ALIGN_SAMPLES) for w in waveforms])
+    batch = np.zeros((len(waveforms), lengths.max()), dtype=np.float32)
+    for i, waveform in enumerate(waveforms):
+        batch[i, : len(waveform)] = waveform
+
+    inputs = torch.from_numpy(batch).to(device)
+    with torch.inference_mode():
+        if model_type == "torchaudio":
+            emissions, _ = model(inputs, lengths=torch.from_numpy(lengths).to(device))
+        else:
+            # Модели с group norm обучены без attention_mask, для них паддинг - просто тишина
+            attention_mask = None
+            if getattr(model.config, "feat_extract_norm", None) == "layer":
+                attention_mask = (
+                    torch.arange(batch.shape[1])[None, :]
+                    < torch.from_numpy(lengths)[:, None]
+                ).to(device, dtype=torch.long)
+            emissions = model(inputs, attention_mask=attention_mask).logits
+        emissions = torch.log_softmax(emissions, dim=-1)
+
+    emissions = emissions.float().cpu().numpy()
+    return emissions, np.minimum(_num_frames(lengths), emissions.shape[1])
+
+
+def _ctc_trellis(
+    emissions: np.ndarray,
+    tokens: np.ndarray,
+    num_frames: np.ndarray,
+    num_tokens: np.ndarray,
+    blank_id: int,
+) -> np.ndarray:
+    """Trellis CTC-выравнивания для батча, как get_trellis в whisperx.
+
+    Цикл идет только по кадрам, каждый шаг считается сразу для всех токенов
+    всех сегментов батча. Кадры и токены за пределами сегмента не читаются.
+    """
+    batch_size, max_frames, _ = emissions.shape
+    token_emissions = np.take_along_axis(
+        emissions,
+        np.broadcast_to(tokens[:, None, :], (*emissions.shape[:2], tokens.shape[1])),
+        axis=2,
+    )
+    blank_emissions = emissions[:, :, blank_id]
+
+    trellis = np.empty((batch_size, max_frames + 1, tokens.shape[1] + 1), np.float32)
+    trellis[:, 0, 0] = 0
+    trellis[:, 1:, 0] = np.cumsum(blank_emissions, axis=1)
+    trellis[:, 0, 1:] = -np.inf
+    # Последние num_tokens кадров сегмента нельзя провести до первого токена
+    rows = np.arange(max_frames + 1)[None, :]
+    late = (rows > (num_frames - num_tokens)[:, None]) & (rows <= num_frames[:, None])
+    trellis[:, :, 0][late] = np.inf
+
+    for t in range(max_frames):
+        trellis[:, t + 1, 1:] = np.maximum(
+            trellis[:, t, 1:] + blank_emissions[:, t, None],
+            trellis[:, t, :-1] + token_emissions[:, t, :],
+        )
+    return trellis
+
+
+def _ctc_backtrack(
+    trellis: np.ndarray,
+    emissions: np.ndarray,
+    tokens: np.ndarray,
+    num_frames: np.ndarray,
+    num_tokens: np.ndarray,
+    blank_id: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Обратный проход по trellis для всех сегментов батча одновременно.
+
+    Возвращает для каждого токена кадры начала и конца, средний score и маску
+    сегментов, для которых путь не найден.
+    """
+    batch_size, max_frames, _ = emissions.shape
+    batch = np.arange(batch_size)
+    frame_rows = np.arange(max_frames + 1)[None, :]
+
+    last_column = trellis[batch, :, num_tokens]
+    last_column = np.where(frame_rows <= num_frames[:, None], last_column, -np.inf)
+    t = last_column.argmax(axis=1)
+    j = num_tokens.copy()
+
+    path_token = np.full((batch_size, max_frames), -1, dtype=np.int64)
+    path_prob = np.zeros((batch_size, max_frames), dtype=np.float32)
+    while True:
+        active = (j > 0) & (t > 0)
+        if not active.any():
+            break
+        b, tb, jb = batch[active], t[active], j[active]
+        token = tokens[b, jb - 1]
+        stayed = trellis[b, tb - 1, jb] + emissions[b, tb - 1, blank_id]
+        changed = trellis[b, tb - 1, jb - 1] + emissions[b, tb - 1, token]
+        is_change = changed > stayed
+
+        path_token[b, tb - 1] = jb - 1
+        path_prob[b, tb - 1] = np.exp(
+            emissions[b, tb - 1, np.where(is_change, token, blank_id)]
+        )
+        j[b] = jb - is_change
+        t[b] = tb - 1
+
+    # Как merge_repeats в whisperx: токен занимает кадры от первого до последнего своего
+    b, frame = np.nonzero(path_token >= 0)
+    token_index = path_token[b, frame]
+    shape = (batch_size, tokens.shape[1])
+    starts = np.full(shape, max_frames, dtype=np.int64)
+    ends = np.zeros(shape, dtype=np.int64)
+    score_sums = np.zeros(shape, dtype=np.float64)
+    counts = np.zeros(shape, dtype=np.int64)
+    np.minimum.at(starts, (b, token_index), frame)
+    np.maximum.at(ends, (b, token_index), frame + 1)
+    np.add.at(score_sums, (b, token_index), path_prob[b, frame])
+    np.add.at(counts, (b, token_index), 1)
+
+    return starts, ends, score_sums / np.maximum(counts, 1), j > 0
+
+
+def _build_words(
+    segment: Dict[str, Any],
+    language: str,
+    char_times: np.ndarray | None,
+) -> Dict[str, Any]:
+    """Сегмент в формате whisperx.align; char_times - (start, end, score) каждого символа текста."""
+    text = segment["text"]
+    if language in LANGUAGES_WITHOUT_SPACES:
+        word_spans = [(cdx, cdx + 1) for cdx in range(len(text))]
+    else:
+        word_spans = []
+        cdx = 0
+        for word in text.split(" "):
+            word_spans.append((cdx, cdx + len(word)))
+            cdx += len(word) + 1
+
+    words = []
+    for word_start, word_end in word_spans:
+        word_text = text[word_start:word_end].strip()
+        if not word_text:
+            continue
+        word: Dict[str, Any] = {"word": word_text}
+        if char_times is not None:
+            start, end, score = char_times[word_start:word_end].T
+            if not np.isnan(start).all():
+                word["start"] = round(float(np.nanmin(start)), 3)
+                word["end"] = round(float(np.nanmax(end)), 3)
+                word["score"] = round(float(np.nanmean(score)), 3)
+        words.append(word)
+
+    timed_words = [word for word in words if "start" in word]
+    return {
+        "start": timed_words[0]["start"] if timed_words else segment["start"],
+        "end": timed_words[-1]["end"] if timed_words else segment["end"],
+        "text": text,
+        "words": words,
+    }
+
+
+def align_batched(
+    transcript: List[Dict[str, Any]],
+    model: Any,
+    align_model_metadata: Dict[str, Any],
+    audio: np.ndarray,
+    device: str,
+    batch_size: int,
+) -> Dict[str, Any]:
+    """Аналог whisperx.align, который выравнивает сегменты батчами.
+
+    whisperx.align делает отдельный проход модели на каждый сегмент и
+    backtrack в Python по одному сегменту. Здесь срезы сегментов, отсортированные
+    по длине, дополняются до общей длины и проходят через модель по batch_size
+    за раз, а trellis и backtrack считаются векторно на весь батч.
+
+    Результат в том же формате ({"segments", "word_segments"}), но сегмент не
+    делится на предложения. Слова сегментов, которые нельзя выровнять, остаются
+    в результате без меток времени (whisperx их отбрасывает).
+    """
+    dictionary = align_model_metadata["dictionary"]
+    language = align_model_metadata["language"]
+    model_type = align_model_metadata["type"]
+    blank_id = _blank_id(dictionary)
+
+    prepared = [
+        _tokenize(index, segment, dictionary, language, len(audio))
+        for index, segment in enumerate(transcript)
+    ]
+    prepared = sorted(
+        (item for item in prepared if item is not None),
+        key=lambda item: item.end_sample - item.start_sample,
+        reverse=True,
+    )
+
+    char_times: Dict[int, np.ndarray] = {}
+    for batch_start in range(0, len(prepared), batch_size):
+        batch = prepared[batch_start : batch_start + batch_size]
+        emissions, num_frames = _emissions(
+            model,
+            model_type,
+            [audio[item.start_sample : item.end_sample] for item in batch],
+            device,
+        )
+
+        num_tokens = np.array([len(item.tokens) for item in batch])
+        tokens = np.full((len(batch), num_tokens.max()), blank_id, dtype=np.int64)
+        for i, item in enumerate(batch):
+            tokens[i, : len(item.tokens)] = item.tokens
+
+        trellis = _ctc_trellis(emissions, tokens, num_frames, num_tokens, blank_id)
+        starts, ends, scores, failed = _ctc_backtrack(
+            trellis, emissions, tokens, num_frames, num_tokens, blank_id
+        )
+
+        for i, item in enumerate(batch):
+            if failed[i] or num_tokens[i] > num_frames[i]:
+                continue
+            segment = transcript[item.index]
+            ratio = (segment["end"] - segment["start"]) / num_frames[i]
+            times = np.full((len(segment["text"]), 3), np.nan)
+            count = num_tokens[i]
+            times[item.char_index, 0] = starts[i, :count] * ratio + segment["start"]
+            times[item.char_index, 1] = ends[i, :count] * ratio + segment["start"]
+            times[item.char_index, 2] = scores[i, :count]
+            # Пробелы не участвуют в границах слов
+            times[[cdx for cdx, char in enumerate(segment["text"]) if char == " "]] = (
+                np.nan
+            )
+            char_times[item.index] = times
+
+    aligned_segments = [
+        _build_words(segment, language, char_times.get(index))
+        for index, segment in enumerate(transcript)
+    ]
+    return {
+        "segments": aligned_segments,
+        "word_segments": [
+            word for segment in aligned_segments for word in segment["words"]
+        ],
+    }
@@ -0,0 +1,491 @@
+import logging
+import subprocess
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, List, Tuple
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from .config import AudioConfig, SilenceConfig
+
+logger = logging.getLogger("whisper-model")
+
+SAMPLE_RATE = 16000
+# Размер блока потокового декодирования
+STREAM_BLOCK_S = 10.0
+
+
+@dataclass
+class DecodedAudio:
+    samples: np.ndarray
+    decode_time: float
+    decoder: str
+
+    @property
+    def duration_s(self) -> float:
+        return len(self.samples) / SAMPLE_RATE
+
+
+@dataclass
+class AudioWindow:
+    offset_s: float
+    samples: np.ndarray
+    is_last: bool
+
+    @property
+    def end_s(self) -> float:
+        return self.offset_s + len(self.samples) / SAMPLE_RATE
+
+
+@dataclass
+class SilenceMap:
+    """Соответствие шкалы записи со сжатой тишиной и исходной шкалы.
+
+    Запись после сжатия - подряд идущие оставленные куски исходной записи;
+    для каждого куска хранится его начало в обеих шкалах.
+    """
+
+    original_starts: np.ndarray
+    compressed_starts: np.ndarray
+    original_duration_s: float
+    compressed_duration_s: float
+
+    @property
+    def saved_s(self) -> float:
+        return self.original_duration_s - self.compressed_duration_s
+
+    def to_original(self, times: np.ndarray) -> np.ndarray:
+        index = np.searchsorted(self.compressed_starts, times, side="right") - 1
+        index = np.clip(index, 0, len(self.compressed_starts) - 1)
+        return self.original_starts[index] + (times - self.compressed_starts[index])
+
+
+# Раскладка файлов в склеенном буфере батча: по строке на файл
+CONCAT_LAYOUT_DTYPE = np.dtype(
+    [
+        ("start_sample", np.int64),
+        ("num_samples", np.int64),
+        ("decode_time", np.float64),
+    ]
+)
+
+
+@dataclass
+class ConcatAudio:
+    samples: np.ndarray
+    file_names: List[str]
+    layout: np.ndarray
+
+    @property
+    def starts_s(self) -> np.ndarray:
+        return self.layout["start_sample"] / SAMPLE_RATE
+
+    @property
+    def durations_s(self) -> np.ndarray:
+        return self.layout["num_samples"] / SAMPLE_RATE
+
+    def file_samples(self, index: int) -> np.ndarray:
+        """Сэмплы одного файла - view на общий буфер, без копирования."""
+        start = self.layout[index]["start_sample"]
+        return self.samples[start : start + self.layout[index]["num_samples"]]
+
+    def subset(self, indices: List[int], silence_duration_s: float) -> "ConcatAudio":
+        """Новый склеенный буфер только из файлов indices, без повторного декодирования."""
+        silence = int(silence_duration_s * SAMPLE_RATE)
+        layout = self.layout[indices].copy()
+        layout["start_sample"] = 0
+        layout["start_sample"][1:] = np.cumsum(layout["num_samples"][:-1] + silence)
+
+        total_samples = int(layout["start_sample"][-1] + layout["num_samples"][-1])
+        samples = np.zeros(total_samples, dtype=np.float32)
+        for new_index, index in enumerate(indices):
+            start = layout[new_index]["start_sample"]
+            samples[start : start + layout[new_index]["num_samples"]] = (
+                self.file_samples(index)
+            )
+
+        return ConcatAudio(
+            samples=samples,
+            file_names=[self.file_names[index] for index in indices],
+            layout=layout,
+        )
+
+
+class AudioDecoder(ABC):
+    name: str
+
+    @abstractmethod
+    def supports(self, audio_path: Path) -> bool: ...
+
+    @abstractmethod
+    def decode(self, audio_path: Path) -> np.ndarray: ...
+
+    @abstractmethod
+    def stream(self, audio_path: Path, block_s: float) -> Iterator[np.ndarray]:
+        """Декодирует файл последовательными блоками 16 кГц mono, не держа его целиком."""
+
+
+class SoundfileDecoder(AudioDecoder):
+    """Декодирование внутри процесса через libsndfile + soxr, без запуска ffmpeg."""
+
+    name = "soundfile"
+    # .oga - расширение, с которым приходят голосовые сообщения Telegram (OGG/Opus)
+    SUPPORTED_SUFFIXES = {".wav", ".flac", ".ogg", ".oga", ".opus"}
+
+    def __init__(self, resample_quality: str = "HQ"):
+        self.resample_quality = resample_quality
+
+    def supports(self, audio_path: Path) -> bool:
+        return audio_path.suffix.lower() in self.SUPPORTED_SUFFIXES
+
+    def decode(self, audio_path: Path) -> np.ndarray:
+        data, sample_rate = sf.read(str(audio_path), dtype="float32", always_2d=True)
+        mono = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+
+        if sample_rate != SAMPLE_RATE:
+            mono = soxr.resample(
+                mono, sample_rate, SAMPLE_RATE, quality=self.resample_quality
+            )
+
+        return np.ascontiguousarray(mono, dtype=np.float32)
+
+    def stream(self, audio_path: Path, block_s: float) -> Iterator[np.ndarray]:
+        sample_rate = sf.info(str(audio_path)).samplerate
+        resampler = (
+            soxr.ResampleStream(
+                sample_rate,
+                SAMPLE_RATE,
+                1,
+                dtype="float32",
+                quality=self.resample_quality,
+            )
+            if sample_rate != SAMPLE_RATE
+            else None
+        )
+
+        for block in sf.blocks(
+            str(audio_path),
+            blocksize=int(block_s * sample_rate),
+            dtype="float32",
+            always_2d=True,
+        ):
+            mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+            if resampler:
+                mono = resampler.resample_chunk(mono)
+            yield np.ascontiguousarray(mono, dtype=np.float32)
+
+        if resampler:
+            yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+class FfmpegDecoder(AudioDecoder):
+    name = "ffmpeg"
+
+    def supports(self, audio_path: Path) -> bool:
+        return True
+
+    def decode(self, audio_path: Path) -> np.ndarray:
+        # whisperx тянет torch, поэтому импортируется только когда нужен ffmpeg
+        import whisperx
+
+        return whisperx.load_audio(str(audio_path), SAMPLE_RATE)
+
+    def stream(self, audio_path: Path, block_s: float) -> Iterator[np.ndarray]:
+        # Те же параметры, что у whisperx.load_audio, но PCM читается из pipe блоками
+        cmd = [
+            "ffmpeg",
+            "-nostdin",
+            "-threads",
+            "0",
+            "-i",
+            str(audio_path),
+            "-f",
+            "s16le",
+            "-ac",
+            "1",
+            "-acodec",
+            "pcm_s16le",
+            "-ar",
+            str(SAMPLE_RATE),
+            "-",
+        ]
+        block_bytes = int(block_s * SAMPLE_RATE) * 2
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        try:
+            while raw := process.stdout.read(block_bytes):  # type: ignore[union-attr]
+                yield np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0
+        finally:
+            process.kill()
+            process.wait()
+
+
+class AudioLoader:
+    def __init__(self, config: AudioConfig):
+        self.decoders: List[AudioDecoder] = []
+        if config.decoder in ("auto", "soundfile"):
+            self.decoders.append(SoundfileDecoder(config.resample_quality))
+        if config.decoder in ("auto", "ffmpeg"):
+            self.decoders.append(FfmpegDecoder())
+
+    def load(self, audio_path: Path) -> DecodedAudio:
+        audio_path = Path(audio_path)
+        start = time.monotonic()
+        last_error: Exception | None = None
+
+        for decoder in self.decoders:
+            if not decoder.supports(audio_path):
+                continue
+            try:
+                samples = decoder.decode(audio_path)
+            except Exception as e:
+                logger.debug(
+                    f"Декодер {decoder.name} не смог прочитать {audio_path}: {e}"
+                )
+                last_error = e
+                continue
+
+            return DecodedAudio(
+                samples=samples,
+                decode_time=time.monotonic() - start,
+                decoder=decoder.name,
+            )
+
+        raise ValueError(
+            f"Не удалось декодировать аудио {audio_path}: {last_error or 'нет подходящего декодера'}"
+        ) from last_error
+
+    def load_concat(
+        self,
+        audio_paths: List[Path],
+        silence_duration_s: float,
+        preprocess: Callable[[Path, np.ndarray], np.ndarray] | None = None,
+    ) -> ConcatAudio:
+        """Склеивает файлы в один float32 буфер по мере декодирования.
+
+        Буфер выделяется по длительностям из заголовков файлов (probe_duration) и
+        при необходимости растет через ndarray.resize, поэтому в памяти одновременно
+        буфер и только один декодированный файл. Паузы между файлами - нулевые
+        промежутки буфера. preprocess применяется к каждому файлу до записи в
+        буфер, его время входит в decode_time.
+        """
+        silence = int(silence_duration_s * SAMPLE_RATE)
+        layout = np.zeros(len(audio_paths), dtype=CONCAT_LAYOUT_DTYPE)
+        estimated_samples = sum(
+            int((self.probe_duration(audio_path) or 0) * SAMPLE_RATE) + silence
+            for audio_path in audio_paths
+        )
+        samples = np.zeros(estimated_samples, dtype=np.float32)
+        position = 0
+
+        for i, audio_path in enumerate(audio_paths):
+            try:
+                decoded_audio = self.load(audio_path)
+            except Exception as e:
+                logger.error(f"Failed to load audio file {audio_path}: {e}")
+                raise
+            file_samples = decoded_audio.samples
+            decode_time = decoded_audio.decode_time
+            if preprocess is not None:
+                start = time.monotonic()
+                file_samples = preprocess(Path(audio_path), file_samples)
+                decode_time += time.monotonic() - start
+
+            if i > 0:
+                position += silence
+            end = position + len(file_samples)
+            if end > len(samples):
+                # Заголовок занизил длительность: буфер растет с запасом, новая часть - нули
+                samples.resize(max(end, int(len(samples) * 1.5)), refcheck=False)
+            samples[position:end] = file_samples
+            layout[i]["start_sample"] = position
+            layout[i]["num_samples"] = len(file_samples)
+            layout[i]["decode_time"] = decode_time
+            position = end
+            del decoded_audio, file_samples
+
+        samples.resize(position, refcheck=False)
+
+        return ConcatAudio(
+            samples=samples,
+            file_names=[Path(audio_path).name for audio_path in audio_paths],
+            layout=layout,
+        )
+
+    def probe_duration(self, audio_path: Path) -> float | None:
+        """Длительность по заголовку файла без декодирования; None, если не удалось."""
+        try:
+            return sf.info(str(audio_path)).duration
+        except Exception:
+            return None
+
+    def stream(
+        self, audio_path: Path, block_s: float = STREAM_BLOCK_S
+    ) -> Iterator[np.ndarray]:
+        audio_path = Path(audio_path)
+        last_error: Exception | None = None
+
+        for decoder in self.decoders:
+            if not decoder.supports(audio_path):
+                continue
+            blocks = decoder.stream(audio_path, block_s)
+            try:
+                # Ошибка открытия файла проявляется на первом блоке - тогда
+                # пробуем следующий декодер
+                first_block = next(blocks, None)
+            except Exception as e:
+                logger.debug(
+                    f"Декодер {decoder.name} не смог прочитать {audio_path}: {e}"
+                )
+                last_error = e
+                continue
+
+            if first_block is not None:
+                yield first_block
+                yield from blocks
+            return
+
+        raise ValueError(
+            f"Не удалось декодировать аудио {audio_path}: {last_error or 'нет подходящего декодера'}"
+        ) from last_error
+
+    def iter_windows(
+        self, audio_path: Path, window_s: float, overlap_s: float
+    ) -> Iterator[AudioWindow]:
+        """Окна длиной window_s с перекрытием overlap_s поверх потокового декодирования.
+
+        В памяти одновременно не больше двух окон, независимо от длины файла.
+        """
+        window = int(window_s * SAMPLE_RATE)
+        overlap = int(overlap_s * SAMPLE_RATE)
+        buffer = np.empty(window, dtype=np.float32)
+        filled = 0
+        offset = 0
+        pending: AudioWindow | None = None
+
+        for block in self.stream(audio_path):
+            position = 0
+            while position < len(block):
+                size = min(window - filled, len(block) - position)
+                buffer[filled : filled + size] = block[position : position + size]
+                filled += size
+                position += size
+
+                if filled < window:
+                    continue
+
+                # Окно отдается только когда известно, последнее ли оно
+                if pending is not None:
+                    yield pending
+                pending = AudioWindow(offset / SAMPLE_RATE, buffer, is_last=False)
+
+                next_buffer = np.empty(window, dtype=np.float32)
+                next_buffer[:overlap] = buffer[window - overlap :]
+                buffer = next_buffer
+                filled = overlap
+                offset += window - overlap
+
+        if filled > overlap or pending is None:
+            if pending is not None:
+                yield pending
+            yield AudioWindow(offset / SAMPLE_RATE, buffer[:filled], is_last=True)
+        else:
+            pending.is_last = True
+            yield pending
+
+
+def quietest_point(
+    samples: np.ndarray, start_s: float, end_s: float, frame_s: float = 0.05
+) -> float:
+    """Середина самого тихого (по RMS) кадра в окне; место для разреза записи."""
+    frame = max(1, int(frame_s * SAMPLE_RATE))
+    start = max(0, int(start_s * SAMPLE_RATE))
+    end = min(len(samples), int(end_s * SAMPLE_RATE))
+    n_frames = (end - start) // frame
+    if n_frames < 1:
+        return end_s
+
+    frames = samples[start : start + n_frames * frame].reshape(n_frames, frame)
+    energy = np.einsum("ij,ij->i", frames, frames)
+    quietest = int(np.argmin(energy))
+    return (start + quietest * frame + frame // 2) / SAMPLE_RATE
+
+
+def compress_silence(
+    samples: np.ndarray, config: SilenceConfig
+) -> Tuple[np.ndarray, SilenceMap]:
+    """Обрезает тишину по краям записи и сжимает паузы длиннее config.max_pause_s.
+
+    Тишина - кадры с RMS ниже config.threshold_db. От пауз внутри записи
+    остается max_pause_s (поровну с каждой стороны), по краям - edge_padding_s.
+    Возвращает сжатую запись и карту для перевода ее времен в исходные.
+    """
+    total = len(samples)
+    frame = max(1, int(config.frame_s * SAMPLE_RATE))
+    n_frames = total // frame
+    identity = SilenceMap(
+        original_starts=np.zeros(1),
+        compressed_starts=np.zeros(1),
+        original_duration_s=total / SAMPLE_RATE,
+        compressed_duration_s=total / SAMPLE_RATE,
+    )
+    if n_frames == 0:
+        return samples, identity
+
+    frames = samples[: n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame + 1e-12)
+    silent = 20 * np.log10(rms) < config.threshold_db
+
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1) * frame
+    run_ends = np.flatnonzero(edges == -1) * frame
+    # Неполный последний кадр относится к последней паузе, если она доходит до конца
+    run_ends[run_ends == n_frames * frame] = total
+
+    edge = int(config.edge_padding_s * SAMPLE_RATE)
+    pause = int(config.max_pause_s * SAMPLE_RATE)
+    leading = run_starts == 0
+    trailing = (run_ends == total) & ~leading
+    cut_starts = np.where(
+        leading, 0, np.where(trailing, run_starts + edge, run_starts + pause // 2)
+    )
+    cut_ends = np.where(
+        leading,
+        run_ends - edge,
+        np.where(trailing, total, run_ends - (pause - pause // 2)),
+    )
+    # Паузы короче max_pause_s и края короче edge_padding_s не трогаем
+    cut = cut_ends > cut_starts
+    cut_starts, cut_ends = cut_starts[cut], cut_ends[cut]
+    if not len(cut_starts):
+        return samples, identity
+
+    keep_starts = np.concatenate(([0], cut_ends))
+    keep_ends = np.concatenate((cut_starts, [total]))
+    keep = keep_ends > keep_starts
+    keep_starts, keep_ends = keep_starts[keep], keep_ends[keep]
+    if not len(keep_starts):
+        identity.compressed_duration_s = 0.0
+        return samples[:0], identity
+
+    lengths = keep_ends - keep_starts
+    compressed_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    compressed = np.empty(int(lengths.sum()), dtype=samples.dtype)
+    for keep_start, keep_end, compressed_start in zip(
+        keep_starts, keep_ends, compressed_starts
+    ):
+        compressed[compressed_start : compressed_start + keep_end - keep_start] = (
+            samples[keep_start:keep_end]
+        )
+
+    return compressed, SilenceMap(
+        original_starts=keep_starts / SAMPLE_RATE,
+        compressed_starts=compressed_starts / SAMPLE_RATE,
+        original_duration_s=total / SAMPLE_RATE,
+        compressed_duration_s=len(compressed) / SAMPLE_RATE,
+    )
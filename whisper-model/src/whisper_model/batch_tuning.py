@@ -0,0 +1,130 @@
+import gc
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+import torch
+
+from .config import BatchTuningConfig
+from .registry import MODEL_REGISTRY
+
+logger = logging.getLogger("whisper-model")
+
+# Этап и модель, для которых запоминается безопасный batch_size
+BatchKey = Tuple[str, str]
+
+
+class BatchOutOfMemoryError(RuntimeError):
+    """Нехватка памяти на этапе с известным batch_size."""
+
+    def __init__(self, key: BatchKey, batch_size: int | None):
+        super().__init__(f"Нехватка памяти на этапе {key[0]} с batch_size={batch_size}")
+        self.key = key
+        self.batch_size = batch_size
+
+
+def is_out_of_memory(error: BaseException) -> bool:
+    if isinstance(error, (BatchOutOfMemoryError, MemoryError)):
+        return True
+    if isinstance(error, torch.cuda.OutOfMemoryError):
+        return True
+    # CTranslate2 и часть операций torch сообщают о нехватке памяти через RuntimeError
+    return isinstance(error, RuntimeError) and "out of memory" in str(error).lower()
+
+
+def release_memory() -> None:
+    """Выгружает неиспользуемые модели реестра и отдает кэш аллокатора CUDA."""
+    MODEL_REGISTRY.clear()
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def free_memory_mb(device: str) -> float | None:
+    """Свободная память устройства; None - если ее не узнать."""
+    if device.startswith("cuda"):
+        if not torch.cuda.is_available():
+            return None
+        free, _ = torch.cuda.mem_get_info(torch.device(device))
+        return free / 2**20
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class SafeBatchSizes:
+    """Предельные batch_size этапов, выученные на нехватке памяти.
+
+    Общие на процесс: после OOM этап с той же моделью больше не запускается
+    с batch_size больше выученного, в том числе из других WhisperXModel.
+    """
+
+    def __init__(self):
+        self._limits: Dict[BatchKey, int] = {}
+        self._lock = threading.Lock()
+
+    def limit(self, key: BatchKey) -> int | None:
+        with self._lock:
+            return self._limits.get(key)
+
+    def shrink(self, key: BatchKey, failed_batch_size: int | None) -> bool:
+        """Запоминает половину batch_size, на котором не хватило памяти.
+
+        Возвращает False, если уменьшать уже некуда.
+        """
+        if not failed_batch_size or failed_batch_size <= 1:
+            return False
+        new_limit = failed_batch_size // 2
+        with self._lock:
+            if self._limits.get(key, failed_batch_size) <= new_limit:
+                return False
+            self._limits[key] = new_limit
+        logger.warning(f"Безопасный batch_size этапа {key[0]}: {new_limit}")
+        return True
+
+
+SAFE_BATCH_SIZES = SafeBatchSizes()
+
+
+def pick_batch_size(
+    config: BatchTuningConfig,
+    key: BatchKey,
+    device: str,
+    configured: int | None,
+    work_items: int,
+    item_mb: float,
+    max_batch_size: int,
+) -> int | None:
+    """batch_size этапа с учетом свободной памяти, объема работы и выученного предела.
+
+    Без config.enabled берется настроенный batch_size, но не больше выученного.
+    """
+    batch_size = configured
+    if config.enabled:
+        batch_size = min(max_batch_size, max(1, work_items))
+        free_mb = free_memory_mb(device)
+        if free_mb is not None:
+            batch_size = min(
+                batch_size, max(1, int(free_mb * config.memory_fraction / item_mb))
+            )
+
+    limit = SAFE_BATCH_SIZES.limit(key)
+    if limit is not None and (batch_size is None or batch_size > limit):
+        batch_size = limit
+    return batch_size
+
+
+@contextmanager
+def oom_stage(key: BatchKey, batch_size: int | None) -> Iterator[None]:
+    """Помечает нехватку памяти внутри блока этапом и batch_size."""
+    try:
+        yield
+    except BatchOutOfMemoryError:
+        raise
+    except Exception as error:
+        if is_out_of_memory(error):
+            raise BatchOutOfMemoryError(key, batch_size) from error
+        raise
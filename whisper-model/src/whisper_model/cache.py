@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from .config import CacheConfig, WhisperXConfig
+
+logger = logging.getLogger("whisper-model")
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    bytes_hashed: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    disk_bytes: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def config_hash(config: WhisperXConfig) -> str:
+    """Стабильный хэш настроек, влияющих на результат транскрипции."""
+    config_dict = config.model_dump(
+        mode="json",
+        exclude={
+            "cache_config",
+            "load_config",
+            "pipeline_config",
+            "batch_tuning_config",
+            "device",
+            "cpu_config",
+        },
+    )
+    config_json = json.dumps(config_dict, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(config_json.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class TranscriptionCache:
+    """Кэш текста транскрипции по содержимому аудиофайла и хэшу конфигурации.
+
+    Два уровня: LRU в памяти и каталог на диске с вытеснением по суммарному
+    размеру. Одинаковые пересланные голосовые сообщения имеют одинаковые байты,
+    поэтому ключ считается по сырому файлу, до декодирования.
+    """
+
+    def __init__(self, config: CacheConfig, config_digest: str):
+        self.config = config
+        self.config_digest = config_digest
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._disk_sizes: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+        self.disk_path = Path(config.disk_path) if config.disk_path else None
+        if self.disk_path:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**self._stats.to_dict())
+
+    def key(self, audio_path: Path) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        size = 0
+        with open(audio_path, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+
+        with self._lock:
+            self._stats.bytes_hashed += size
+        return f"{digest.hexdigest()}-{self.config_digest}"
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self._stats.hits += 1
+                self._stats.memory_hits += 1
+                return text
+
+            text = self._read_disk(key)
+            if text is not None:
+                self._put_memory(key, text)
+                self._stats.hits += 1
+                self._stats.disk_hits += 1
+                return text
+
+            self._stats.misses += 1
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            self._put_memory(key, text)
+            self._write_disk(key, text)
+
+    def _put_memory(self, key: str, text: str) -> None:
+        if self.config.memory_max_entries == 0:
+            return
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    def _entry_path(self, key: str) -> Path:
+        assert self.disk_path is not None
+        return self.disk_path / f"{key}.json"
+
+    def _load_disk_index(self) -> None:
+        entries = []
+        for entry_path in self.disk_path.glob("*.json"):  # type: ignore[union-attr]
+            stat = entry_path.stat()
+            entries.append((stat.st_mtime, entry_path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk_sizes[key] = size
+        self._stats.disk_bytes = sum(self._disk_sizes.values())
+        logger.info(
+            f"Дисковый кэш {self.disk_path}: {len(self._disk_sizes)} записей, {self._stats.disk_bytes} байт"
+        )
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if not self.disk_path or key not in self._disk_sizes:
+            return None
+
+        entry_path = self._entry_path(key)
+        try:
+            raw = entry_path.read_bytes()
+            entry_path.touch()
+        except OSError:
+            self._forget_disk_entry(key)
+            return None
+
+        self._disk_sizes.move_to_end(key)
+        self._stats.bytes_read += len(raw)
+        return json.loads(raw)["text"]
+
+    def _write_disk(self, key: str, text: str) -> None:
+        if not self.disk_path:
+            return
+
+        raw = json.dumps({"text": text}, ensure_ascii=False).encode("utf-8")
+        if len(raw) > self.config.disk_max_bytes:
+            return
+
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_suffix(".tmp")
+        tmp_path.write_bytes(raw)
+        os.replace(tmp_path, entry_path)
+
+        self._forget_disk_entry(key, unlink=False)
+        self._disk_sizes[key] = len(raw)
+        self._stats.disk_bytes += len(raw)
+        self._stats.bytes_written += len(raw)
+
+        while self._stats.disk_bytes > self.config.disk_max_bytes:
+            oldest_key = next(iter(self._disk_sizes))
+            self._forget_disk_entry(oldest_key)
+
+    def _forget_disk_entry(self, key: str, unlink: bool = True) -> None:
+        size = self._disk_sizes.pop(key, None)
+        if size is None:
+            return
+        self._stats.disk_bytes -= size
+        if unlink:
+            self._entry_path(key).unlink(missing_ok=True)
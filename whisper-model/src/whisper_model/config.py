@@ -1,5 +1,10 @@
 import json
-from pydantic import BaseModel, Field
+from pathlib import Path
+from typing import Dict, List, Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+from .cpu import CPU_COMPUTE_TYPE, plan_cpu_budget
 
 
 class AsrOptions(BaseModel):
@@ -18,12 +23,25 @@ class WhisperConfig(BaseModel):
     asr_options: AsrOptions = Field(...)
     transcribe_options: TranscribeOptions = Field(...)
     language: str | None = Field(None, min_length=2)
+    # cpu_threads CTranslate2, используются только на CPU
+    threads: int = Field(4, ge=1)
 
 
 class AlignConfig(BaseModel):
     language_code: str = Field("ru", min_length=2)
     device: str = Field("cuda", min_length=3)
     model_name: str | None = Field(None, min_length=5)
+    # Выбирать модель выравнивания по языку, определенному Whisper
+    language_routing: bool = Field(False)
+    # Модели выравнивания для отдельных языков; для остальных - модель whisperx по умолчанию
+    model_names: Dict[str, str] = Field(default_factory=dict)
+    max_loaded_models: int = Field(3, ge=1)
+    # full - выравнивать всю запись, adaptive - только сегменты Whisper рядом со
+    # сменами спикера (запись с одним спикером не выравнивается вовсе)
+    mode: Literal["full", "adaptive"] = Field("full")
+    change_margin_s: float = Field(0.5, ge=0)
+    # Сегментов за один проход модели выравнивания; None - whisperx.align по одному сегменту
+    batch_size: int | None = Field(None, ge=1)
 
 
 class PeakConfig(BaseModel):
@@ -37,13 +55,156 @@ class SegmentationConfig(BaseModel):
     batch_size: int = Field(32)
     step: float = Field(0.75)
     peak_config: PeakConfig = Field(...)
+    # В transcribe_batch резать на окна каждый файл отдельно и прогонять окна
+    # всех файлов общими батчами вместо сегментации склеенной записи
+    batch_across_files: bool = Field(False)
+    # torch - pyannote Inference на device, onnx - ONNX Runtime на CPU
+    backend: Literal["torch", "onnx"] = Field("torch")
+    # Путь к экспортированной модели; если файла нет, модель экспортируется
+    onnx_path: Path | None = Field(None)
+    onnx_quantize: bool = Field(False)
+    intra_op_threads: int | None = Field(None, ge=1)
+    inter_op_threads: int | None = Field(None, ge=1)
+
+
+class AudioConfig(BaseModel):
+    decoder: Literal["auto", "soundfile", "ffmpeg"] = Field("auto")
+    resample_quality: Literal["QQ", "LQ", "MQ", "HQ", "VHQ"] = Field("HQ")
+
+
+class CacheConfig(BaseModel):
+    enabled: bool = Field(False)
+    memory_max_entries: int = Field(1024, ge=0)
+    disk_path: Path | None = Field(None)
+    disk_max_bytes: int = Field(256 * 1024 * 1024, ge=0)
+
+
+class PipelineConfig(BaseModel):
+    concurrent_segmentation: bool = Field(False)
+    stage_queue_size: int = Field(2, ge=1)
+
+
+class StreamConfig(BaseModel):
+    min_chunk_s: float = Field(15.0, gt=0)
+    max_chunk_s: float = Field(60.0, gt=0)
+
+
+class LongAudioConfig(BaseModel):
+    enabled: bool = Field(False)
+    threshold_s: float = Field(1800.0, gt=0)
+    window_s: float = Field(600.0, gt=0)
+    overlap_s: float = Field(10.0, ge=0)
+
+    @model_validator(mode="after")
+    def _check_overlap(self) -> "LongAudioConfig":
+        # Иначе окна не сдвигаются и iter_windows не заканчивается
+        if self.overlap_s >= self.window_s:
+            raise ValueError(
+                f"overlap_s ({self.overlap_s}) должен быть меньше window_s ({self.window_s})"
+            )
+        return self
+
+
+class SilenceConfig(BaseModel):
+    # Обрезать тишину по краям и сжимать длинные паузы перед ASR
+    enabled: bool = Field(False)
+    # Кадр тише этого уровня (RMS, dBFS) считается тишиной
+    threshold_db: float = Field(-40.0, le=0)
+    frame_s: float = Field(0.02, gt=0)
+    # Паузы длиннее сжимаются до max_pause_s
+    max_pause_s: float = Field(1.0, ge=0)
+    # Сколько тишины оставить в начале и в конце записи
+    edge_padding_s: float = Field(0.2, ge=0)
+
+
+class BatchConfig(BaseModel):
+    # concat - склеить файлы через паузы и транскрибировать как одну запись,
+    # vad_chunks - VAD по каждому файлу и общие батчи Whisper из кусков речи всех файлов
+    mode: Literal["concat", "vad_chunks"] = Field("concat")
+    # Максимальная длина куска речи для Whisper
+    chunk_size_s: float = Field(30.0, gt=0, le=30)
+
+
+class CpuConfig(BaseModel):
+    # Ядра, к которым привязывается процесс; None - все доступные
+    affinity: List[int] | None = Field(None, min_length=1)
+    # Потоки этапов; None - делятся между этапами автоматически
+    whisper_threads: int | None = Field(None, ge=1)
+    torch_threads: int | None = Field(None, ge=1)
+    interop_threads: int | None = Field(None, ge=1)
+    segmentation_threads: int | None = Field(None, ge=1)
+
+
+class BatchTuningConfig(BaseModel):
+    # Подбирать batch_size Whisper и сегментации по свободной памяти и длине аудио
+    enabled: bool = Field(False)
+    # При нехватке памяти делить батч файлов пополам и повторять
+    split_on_oom: bool = Field(False)
+    # Доля свободной памяти устройства под батчи
+    memory_fraction: float = Field(0.5, gt=0, le=1)
+    # Оценка памяти на элемент батча: кусок Whisper до 30 с и окно сегментации
+    whisper_item_mb: float = Field(200.0, gt=0)
+    segmentation_item_mb: float = Field(10.0, gt=0)
+    max_whisper_batch_size: int = Field(32, ge=1)
+    max_segmentation_batch_size: int = Field(256, ge=1)
+
+
+class LoadConfig(BaseModel):
+    # eager - загрузить все модели в конструкторе, lazy - при первом обращении,
+    # background - начать загрузку в фоне и не ждать ее в конструкторе
+    mode: Literal["eager", "lazy", "background"] = Field("eager")
+    parallel: bool = Field(False)
+    # Бюджет памяти реестра загруженных моделей процесса; None - без ограничения
+    registry_budget_mb: int | None = Field(None, ge=0)
 
 
 class WhisperXConfig(BaseModel):
     whisper_config: WhisperConfig = Field(...)
     align_config: AlignConfig = Field(...)
     segmentation_config: SegmentationConfig = Field(...)
-    
+    audio_config: AudioConfig = Field(default_factory=AudioConfig)
+    cache_config: CacheConfig = Field(default_factory=CacheConfig)
+    pipeline_config: PipelineConfig = Field(default_factory=PipelineConfig)
+    stream_config: StreamConfig = Field(default_factory=StreamConfig)
+    long_audio_config: LongAudioConfig = Field(default_factory=LongAudioConfig)
+    batch_config: BatchConfig = Field(default_factory=BatchConfig)
+    silence_config: SilenceConfig = Field(default_factory=SilenceConfig)
+    batch_tuning_config: BatchTuningConfig = Field(default_factory=BatchTuningConfig)
+    load_config: LoadConfig = Field(default_factory=LoadConfig)
+    # cpu - профиль CPU: устройства, compute_type и потоки всех этапов
+    # выставляются сами, если не заданы явно
+    device: Literal["cuda", "cpu"] | None = Field(None)
+    cpu_config: CpuConfig = Field(default_factory=CpuConfig)
+
+    @model_validator(mode="after")
+    def _apply_cpu_profile(self) -> "WhisperXConfig":
+        if self.device != "cpu":
+            return self
+
+        budget = plan_cpu_budget(
+            self.cpu_config, self.pipeline_config.concurrent_segmentation
+        )
+        defaults = [
+            (
+                self.whisper_config,
+                {
+                    "device": "cpu",
+                    "compute_type": CPU_COMPUTE_TYPE,
+                    "threads": budget.whisper_threads,
+                },
+            ),
+            (self.align_config, {"device": "cpu"}),
+            (
+                self.segmentation_config,
+                {"device": "cpu", "intra_op_threads": budget.segmentation_threads},
+            ),
+        ]
+        for config, values in defaults:
+            for name, value in values.items():
+                if name not in config.model_fields_set:
+                    setattr(config, name, value)
+        return self
+
     @staticmethod
     def from_json(json_path: str) -> "WhisperXConfig":
         with open(json_path, "r") as f:
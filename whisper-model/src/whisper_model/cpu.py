@@ -0,0 +1,75 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .config import CpuConfig
+
+logger = logging.getLogger("whisper-model")
+
+# CTranslate2 не поддерживает float16 на CPU, int8 - самый быстрый вариант
+CPU_COMPUTE_TYPE = "int8"
+
+
+@dataclass
+class CpuBudget:
+    """Потоки каждого этапа на CPU."""
+
+    # cpu_threads CTranslate2 (Whisper)
+    whisper_threads: int
+    # intra-op потоки torch: выравнивание и сегментация через torch
+    torch_threads: int
+    interop_threads: int
+    # intra-op потоки ONNX Runtime для сегментации
+    segmentation_threads: int
+
+
+def available_cores(cpu_config: "CpuConfig") -> int:
+    if cpu_config.affinity:
+        return len(cpu_config.affinity)
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def plan_cpu_budget(
+    cpu_config: "CpuConfig", concurrent_segmentation: bool
+) -> CpuBudget:
+    """Делит ядра между этапами.
+
+    Этапы идут по очереди, поэтому каждый получает все ядра. При параллельной
+    сегментации она идет одновременно с Whisper и получает четверть ядер,
+    Whisper - остальные, чтобы потоки не вытесняли друг друга.
+    Явно заданные в cpu_config значения не меняются.
+    """
+    cores = available_cores(cpu_config)
+    segmentation_threads = max(1, cores // 4) if concurrent_segmentation else cores
+    whisper_threads = (
+        max(1, cores - segmentation_threads) if concurrent_segmentation else cores
+    )
+    return CpuBudget(
+        whisper_threads=cpu_config.whisper_threads or whisper_threads,
+        torch_threads=cpu_config.torch_threads or segmentation_threads,
+        interop_threads=cpu_config.interop_threads or 1,
+        segmentation_threads=cpu_config.segmentation_threads or segmentation_threads,
+    )
+
+
+def apply_cpu_budget(cpu_config: "CpuConfig", budget: CpuBudget) -> None:
+    """Привязка процесса к ядрам и потоки torch (они общие на процесс)."""
+    import torch
+
+    if cpu_config.affinity and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpu_config.affinity)
+
+    torch.set_num_threads(budget.torch_threads)
+    try:
+        torch.set_num_interop_threads(budget.interop_threads)
+    except RuntimeError:
+        # Число inter-op потоков задается один раз до первой параллельной работы torch
+        logger.warning(
+            f"Не удалось задать inter-op потоки torch ({budget.interop_threads}): уже используются {torch.get_num_interop_threads()}"
+        )
+
+    logger.info(f"CPU профиль: {cpu_config.affinity or 'все ядра'}, {budget}")
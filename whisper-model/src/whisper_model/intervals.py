@@ -0,0 +1,315 @@
+from typing import TYPE_CHECKING, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from pyannote.core import Segment, Timeline
+
+if TYPE_CHECKING:
+    from whisperx.alignment import SingleAlignedSegment, SingleWordSegment
+
+# Минимальная длина куска сегмента, который остается в файле после разрезания
+# склеенной временной шкалы по границам файлов
+MIN_SEGMENT_PIECE_S = 0.3
+
+
+def _times(items: Sequence[dict], key: str) -> np.ndarray:
+    """Массив времен; отсутствующие метки (нет ключа или None) становятся NaN."""
+    return np.fromiter(
+        (np.nan if item.get(key) is None else item[key] for item in items),
+        dtype=np.float64,
+        count=len(items),
+    )
+
+
+def _forward_fill_index(index: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Элементы без метки времени наследуют индекс предыдущего размеченного элемента.
+
+    Индекс делается неубывающим, ведущие неразмеченные элементы получают 0.
+    """
+    filled = np.where(valid, index, -1)
+    filled = np.maximum.accumulate(filled) if len(filled) else filled
+    return np.maximum(filled, 0)
+
+
+def _split_by_index(items: Sequence, index: np.ndarray) -> List[List]:
+    bounds = np.flatnonzero(np.diff(index)) + 1
+    starts = np.concatenate(([0], bounds))
+    ends = np.concatenate((bounds, [len(items)]))
+    return [list(items[start:end]) for start, end in zip(starts, ends)]
+
+
+def assign_words_to_segments(
+    word_segments: List["SingleWordSegment"], segments_timeline: Timeline
+) -> List[List["SingleWordSegment"]]:
+    """Группирует слова по сегментам между сменами спикера.
+
+    Слово попадает в первый сегмент, конец которого не раньше конца слова.
+    Слова после конца последнего сегмента остаются в последнем сегменте.
+    """
+    if not word_segments:
+        return []
+
+    segment_ends = np.fromiter(
+        (segment.end for segment in segments_timeline), dtype=np.float64
+    )
+    if len(segment_ends) == 0:
+        return [list(word_segments)]
+
+    word_ends = _times(word_segments, "end")
+    valid = ~np.isnan(word_ends)
+    segment_index = np.searchsorted(segment_ends, word_ends, side="left")
+    segment_index = np.minimum(segment_index, len(segment_ends) - 1)
+    segment_index = _forward_fill_index(segment_index, valid)
+
+    return _split_by_index(word_segments, segment_index)
+
+
+def segments_near_changes(
+    segments: List[Dict], segments_timeline: Timeline, margin_s: float
+) -> np.ndarray:
+    """Маска сегментов Whisper, у которых смена спикера ближе margin_s к границам или внутри.
+
+    Смены спикера - концы сегментов временной шкалы, кроме последнего.
+    Сегменты без меток времени считаются требующими выравнивания.
+    """
+    starts = _times(segments, "start")
+    ends = _times(segments, "end")
+    untimed = np.isnan(starts) | np.isnan(ends)
+
+    change_points = np.fromiter(
+        (segment.end for segment in segments_timeline), dtype=np.float64
+    )[:-1]
+    if len(change_points) == 0:
+        return untimed
+
+    first = np.searchsorted(change_points, starts - margin_s, side="left")
+    last = np.searchsorted(change_points, ends + margin_s, side="right")
+    return (last > first) | untimed
+
+
+def segment_as_word(segment: Dict) -> Dict:
+    """Сегмент Whisper целиком как одно "слово" для сегментов без выравнивания."""
+    return {
+        "word": str(segment.get("text", "")).strip(),
+        "start": segment.get("start"),
+        "end": segment.get("end"),
+    }
+
+
+def decompose_words(
+    file_names: List[str],
+    file_starts: np.ndarray,
+    file_durations: np.ndarray,
+    aligned_segments: List["SingleAlignedSegment"],
+    silence_duration_s: float,
+) -> Dict[str, List["SingleWordSegment"]]:
+    """Раскладывает слова склеенной записи по исходным файлам.
+
+    Сегмент относится к первому файлу, чья граница (с половиной паузы после
+    файла) не раньше начала сегмента. Времена слов переводятся в шкалу файла.
+    """
+    words_by_file: Dict[str, List["SingleWordSegment"]] = {
+        name: [] for name in file_names
+    }
+    if not aligned_segments or not file_names:
+        return words_by_file
+
+    file_bounds = file_starts + file_durations + silence_duration_s * 0.5
+    file_bounds[-1] = np.inf
+
+    segment_starts = _times(aligned_segments, "start")
+    file_index = np.searchsorted(file_bounds, segment_starts, side="left")
+    file_index = _forward_fill_index(file_index, ~np.isnan(segment_starts))
+
+    words = [word for segment in aligned_segments for word in segment["words"]]
+    if not words:
+        return words_by_file
+    word_file_index = np.repeat(
+        file_index, [len(segment["words"]) for segment in aligned_segments]
+    )
+
+    word_starts = _times(words, "start")
+    word_ends = _times(words, "end")
+    offsets = file_starts[word_file_index]
+    relative_starts = np.maximum(0.0, word_starts - offsets)
+    relative_ends = np.minimum(file_durations[word_file_index], word_ends - offsets)
+    timed = ~np.isnan(word_starts) & ~np.isnan(word_ends)
+
+    for i, word in enumerate(words):
+        adjusted_word = word.copy()
+        if timed[i]:
+            adjusted_word["start"] = float(relative_starts[i])
+            adjusted_word["end"] = float(relative_ends[i])
+        words_by_file[file_names[word_file_index[i]]].append(adjusted_word)
+
+    return words_by_file
+
+
+def decompose_segments(
+    file_names: List[str],
+    file_starts: np.ndarray,
+    file_durations: np.ndarray,
+    segments_timeline: Timeline,
+    min_piece_s: float = MIN_SEGMENT_PIECE_S,
+) -> Dict[str, Timeline]:
+    """Режет временную шкалу склеенной записи по границам файлов.
+
+    Сегменты шкалы не пересекаются и упорядочены, поэтому пересекающиеся с
+    файлом сегменты находятся двумя бинарными поисками.
+    """
+    segments = list(segments_timeline)
+    event_starts = np.fromiter((s.start for s in segments), dtype=np.float64)
+    event_ends = np.fromiter((s.end for s in segments), dtype=np.float64)
+    file_ends = file_starts + file_durations
+
+    first = np.searchsorted(event_ends, file_starts, side="right")
+    last = np.searchsorted(event_starts, file_ends, side="left")
+
+    file_timelines: Dict[str, Timeline] = {}
+    for i, file_name in enumerate(file_names):
+        piece_starts = (
+            np.maximum(event_starts[first[i] : last[i]], file_starts[i])
+            - file_starts[i]
+        )
+        piece_ends = (
+            np.minimum(event_ends[first[i] : last[i]], file_ends[i]) - file_starts[i]
+        )
+        keep = piece_ends - piece_starts > min_piece_s
+        file_timelines[file_name] = Timeline(
+            segments=[
+                Segment(float(start), float(end))
+                for start, end in zip(piece_starts[keep], piece_ends[keep])
+            ]
+        )
+
+    return file_timelines
+
+
+def plan_stream_chunks(
+    segments_timeline: Timeline,
+    duration_s: float,
+    min_chunk_s: float,
+    max_chunk_s: float,
+    split_point: Callable[[float, float], float],
+) -> List[Tuple[float, float]]:
+    """Делит запись на куски для потоковой транскрипции.
+
+    Куски заканчиваются на сменах спикера, как только набрано min_chunk_s.
+    Реплика длиннее max_chunk_s режется в точке, которую split_point выбирает
+    во второй половине окна max_chunk_s.
+    """
+    turn_ends = [
+        segment.end for segment in segments_timeline if segment.end < duration_s
+    ]
+    turn_ends.append(duration_s)
+
+    chunks: List[Tuple[float, float]] = []
+    chunk_start = 0.0
+    for turn_end in turn_ends:
+        while turn_end - chunk_start > max_chunk_s:
+            split_at = split_point(
+                chunk_start + max_chunk_s * 0.5, chunk_start + max_chunk_s
+            )
+            chunks.append((chunk_start, split_at))
+            chunk_start = split_at
+
+        if turn_end - chunk_start >= min_chunk_s:
+            chunks.append((chunk_start, turn_end))
+            chunk_start = turn_end
+
+    if chunk_start < duration_s:
+        chunks.append((chunk_start, duration_s))
+
+    return chunks
+
+
+def shift_words(
+    word_segments: List["SingleWordSegment"], offset_s: float
+) -> List["SingleWordSegment"]:
+    """Переводит времена слов из шкалы куска записи в шкалу всего файла."""
+    shifted_words = []
+    for word in word_segments:
+        shifted_word = word.copy()
+        for key in ("start", "end"):
+            if word.get(key) is not None:
+                shifted_word[key] = word[key] + offset_s
+        shifted_words.append(shifted_word)
+    return shifted_words
+
+
+def remap_words(
+    word_segments: List["SingleWordSegment"],
+    to_original: Callable[[np.ndarray], np.ndarray],
+) -> List["SingleWordSegment"]:
+    """Переводит времена слов в исходную шкалу записи (после сжатия тишины)."""
+    if not word_segments:
+        return []
+
+    times = {key: to_original(_times(word_segments, key)) for key in ("start", "end")}
+    remapped_words = []
+    for i, word in enumerate(word_segments):
+        remapped_word = word.copy()
+        for key in ("start", "end"):
+            if word.get(key) is not None:
+                remapped_word[key] = float(times[key][i])
+        remapped_words.append(remapped_word)
+    return remapped_words
+
+
+def remap_timeline(
+    segments_timeline: Timeline, to_original: Callable[[np.ndarray], np.ndarray]
+) -> Timeline:
+    segments = list(segments_timeline)
+    if not segments:
+        return Timeline()
+    starts = to_original(np.array([segment.start for segment in segments]))
+    ends = to_original(np.array([segment.end for segment in segments]))
+    return Timeline(
+        segments=[Segment(float(start), float(end)) for start, end in zip(starts, ends)]
+    )
+
+
+def select_words_in_range(
+    word_segments: List["SingleWordSegment"], start_s: float, end_s: float
+) -> List["SingleWordSegment"]:
+    """Слова, середина которых лежит в [start_s, end_s).
+
+    Слова без меток времени идут вместе с предыдущим размеченным словом
+    (ведущие - со следующим).
+    """
+    if not word_segments:
+        return []
+
+    middles = (_times(word_segments, "start") + _times(word_segments, "end")) / 2
+    valid = ~np.isnan(middles)
+    if not valid.any():
+        return list(word_segments)
+
+    inside = (middles >= start_s) & (middles < end_s)
+    source_index = _forward_fill_index(np.arange(len(middles)), valid)
+    source_index[: np.argmax(valid)] = np.argmax(valid)
+    keep = inside[source_index]
+
+    return [word for word, kept in zip(word_segments, keep) if kept]
+
+
+def stitch_timeline_piece(
+    stitched: List[Segment],
+    segments_timeline: Timeline,
+    offset_s: float,
+    start_s: float,
+    end_s: float,
+) -> None:
+    """Добавляет в stitched часть шкалы окна между швами start_s и end_s.
+
+    Шов не является сменой спикера, поэтому сегмент, упирающийся в шов,
+    склеивается с сегментом предыдущего окна, который в этот шов упирается.
+    """
+    for segment in segments_timeline:
+        piece_start = max(segment.start + offset_s, start_s)
+        piece_end = min(segment.end + offset_s, end_s)
+        if piece_start >= piece_end:
+            continue
+
+        if stitched and piece_start == start_s and stitched[-1].end == start_s:
+            piece_start = stitched.pop().start
+        stitched.append(Segment(piece_start, piece_end))
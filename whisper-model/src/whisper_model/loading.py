@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Callable, Generic, TypeVar
+
+logger = logging.getLogger("whisper-model")
+
+T = TypeVar("T")
+
+
+class LazyResource(Generic[T]):
+    """Модель, которая загружается при первом обращении или заранее в фоне.
+
+    get() потокобезопасен: параллельные обращения дожидаются одной загрузки.
+    После неудачной загрузки следующее обращение пробует загрузить заново.
+    """
+
+    def __init__(
+        self, name: str, loader: Callable[[], T], log_level: int = logging.INFO
+    ):
+        self.name = name
+        self._loader: Callable[[], T] | None = loader
+        self._log_level = log_level
+        self._lock = threading.Lock()
+        self._future: Future | None = None
+        self.load_time: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.load_time is not None
+
+    def start(self, executor: Executor) -> Future:
+        """Запускает загрузку в executor, не дожидаясь ее."""
+        with self._lock:
+            if self._future is None:
+                self._future = executor.submit(self._load)
+            return self._future
+
+    def get(self) -> T:
+        with self._lock:
+            future = self._future
+            if future is not None and future.done() and future.exception():
+                future = None
+            if future is None:
+                self._future = future = Future()
+                future.set_running_or_notify_cancel()
+                load_here = True
+            else:
+                load_here = False
+
+        if load_here:
+            try:
+                future.set_result(self._load())
+            except Exception as e:
+                future.set_exception(e)
+                raise
+        return future.result()
+
+    def _load(self) -> T:
+        start = time.monotonic()
+        value = self._loader()  # type: ignore[misc]
+        # Загрузчик больше не нужен, не держим ссылки на его замыкание
+        self._loader = None
+        self.load_time = time.monotonic() - start
+        logger.log(
+            self._log_level, f"Модель {self.name} готова за {self.load_time:.2f}s"
+        )
+        return value
@@ -0,0 +1,106 @@
+import logging
+import re
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from pyannote.audio import Inference
+
+logger = logging.getLogger("whisper-model")
+
+DEFAULT_ONNX_DIR = Path.home() / ".cache" / "whisper-model" / "onnx"
+
+
+def default_onnx_path(model: str, quantize: bool) -> Path:
+    name = re.sub(r"[^\w.-]+", "_", model)
+    return DEFAULT_ONNX_DIR / f"{name}{'-int8' if quantize else ''}.onnx"
+
+
+def export_onnx(inference: Inference, onnx_path: Path, quantize: bool) -> Path:
+    """Экспортирует модель сегментации в ONNX с переменным размером батча.
+
+    Длина входа фиксирована окном inference.duration. При quantize веса
+    дополнительно квантуются в int8 (динамическая квантизация onnxruntime).
+    """
+    onnx_path.parent.mkdir(parents=True, exist_ok=True)
+    window_size = inference.model.audio.get_num_samples(inference.duration)
+    dummy_input = torch.zeros(1, 1, window_size)
+
+    fp32_path = onnx_path.with_suffix(".fp32.onnx") if quantize else onnx_path
+    model = inference.model.to(torch.device("cpu")).eval()
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            dummy_input,
+            str(fp32_path),
+            input_names=["waveform"],
+            output_names=["scores"],
+            dynamic_axes={"waveform": {0: "batch"}, "scores": {0: "batch"}},
+            opset_version=17,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(onnx_path), weight_type=QuantType.QInt8)
+        fp32_path.unlink(missing_ok=True)
+
+    logger.info(f"Модель сегментации экспортирована в {onnx_path}")
+    return onnx_path
+
+
+class OnnxInference(Inference):
+    """Inference pyannote, у которого прямой проход идет через ONNX Runtime.
+
+    Нарезка на окна, pre_aggregation_hook и агрегация остаются от Inference,
+    поэтому результат - тот же SlidingWindowFeature. Torch-модель нужна только
+    для спецификаций и экспорта и остается на CPU.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        onnx_path: Path | None = None,
+        quantize: bool = False,
+        intra_op_threads: int | None = None,
+        inter_op_threads: int | None = None,
+        pre_aggregation_hook: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        **inference_kwargs,
+    ):
+        super().__init__(
+            model,
+            device=torch.device("cpu"),
+            pre_aggregation_hook=pre_aggregation_hook,
+            **inference_kwargs,
+        )
+
+        onnx_path = Path(onnx_path or default_onnx_path(model, quantize))
+        if not onnx_path.exists():
+            export_onnx(self, onnx_path, quantize)
+
+        session_options = ort.SessionOptions()
+        if intra_op_threads:
+            session_options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            session_options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(
+            str(onnx_path),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_name = self.session.get_inputs()[0].name
+        logger.info(f"Сегментация через ONNX Runtime: {onnx_path}")
+
+    def infer(self, chunks: torch.Tensor) -> np.ndarray:
+        if isinstance(self.conversion, torch.nn.ModuleList):
+            raise ValueError(
+                "Модель сегментации с несколькими выходами не поддерживается"
+            )
+
+        (scores,) = self.session.run(
+            None, {self._input_name: chunks.cpu().numpy().astype(np.float32)}
+        )
+        with torch.inference_mode():
+            return self.conversion(torch.from_numpy(scores)).cpu().numpy()
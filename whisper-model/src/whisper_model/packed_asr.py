@@ -0,0 +1,105 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+from faster_whisper.tokenizer import Tokenizer
+
+from .audio import SAMPLE_RATE
+
+logger = logging.getLogger("whisper-model")
+
+
+@dataclass
+class SpeechChunk:
+    """Кусок речи файла батча: индекс файла и границы в шкале файла."""
+
+    file_index: int
+    start: float
+    end: float
+
+
+def vad_chunks(pipeline: Any, audio: np.ndarray, chunk_size: float) -> List[Dict]:
+    """Куски речи файла так же, как их режет FasterWhisperPipeline.transcribe."""
+    vad_model = pipeline.vad_model
+    if hasattr(vad_model, "merge_chunks"):
+        # whisperx >= 3.3: VAD - подкласс whisperx.vads.Vad
+        waveform = vad_model.preprocess_audio(audio)
+        merge_chunks = vad_model.merge_chunks
+    else:
+        from whisperx.vad import merge_chunks
+
+        waveform = torch.from_numpy(audio).unsqueeze(0)
+
+    vad_segments = vad_model({"waveform": waveform, "sample_rate": SAMPLE_RATE})
+    return merge_chunks(
+        vad_segments,
+        chunk_size,
+        onset=pipeline._vad_params["vad_onset"],
+        offset=pipeline._vad_params["vad_offset"],
+    )
+
+
+def _chunk_audio(audios: List[np.ndarray], chunk: SpeechChunk) -> np.ndarray:
+    audio = audios[chunk.file_index]
+    return audio[int(chunk.start * SAMPLE_RATE) : int(chunk.end * SAMPLE_RATE)]
+
+
+def transcribe_packed(
+    pipeline: Any,
+    audios: List[np.ndarray],
+    language: str,
+    batch_size: int | None,
+    chunk_size: float = 30,
+) -> List[List[Dict[str, Any]]]:
+    """ASR нескольких файлов общими батчами Whisper без склейки.
+
+    VAD запускается по каждому файлу, куски речи всех файлов с метками
+    (файл, начало, конец) идут в модель пайплайна whisperx батчами, и сегменты
+    возвращаются своему файлу по метке. Паузы между файлами не
+    транскрибируются, а сегменты не нужно раскладывать по файлам эвристикой.
+    Возвращает сегменты Whisper каждого файла в шкале этого файла.
+    """
+    chunks: List[SpeechChunk] = [
+        SpeechChunk(file_index, segment["start"], segment["end"])
+        for file_index, audio in enumerate(audios)
+        for segment in vad_chunks(pipeline, audio, chunk_size)
+    ]
+    segments_by_file: List[List[Dict[str, Any]]] = [[] for _ in audios]
+    if not chunks:
+        return segments_by_file
+
+    # Пайплайн общий в реестре, поэтому токенизатор с языком батча не ставится на него,
+    # а передается в модель напрямую, как это делает FasterWhisperPipeline._forward
+    tokenizer = Tokenizer(
+        pipeline.model.hf_tokenizer,
+        pipeline.model.model.is_multilingual,
+        task="transcribe",
+        language=language,
+    )
+    batch_size = batch_size or pipeline._batch_size or 1
+    for batch_start in range(0, len(chunks), batch_size):
+        batch_chunks = chunks[batch_start : batch_start + batch_size]
+        features = torch.stack(
+            [
+                pipeline.preprocess({"inputs": _chunk_audio(audios, chunk)})["inputs"]
+                for chunk in batch_chunks
+            ]
+        )
+        outputs = pipeline.model.generate_segment_batched(
+            features, tokenizer, pipeline.options
+        )
+        # whisperx >= 3.3 возвращает словарь с текстами и avg_logprob
+        texts = outputs["text"] if isinstance(outputs, dict) else outputs
+        for chunk, text in zip(batch_chunks, texts):
+            segments_by_file[chunk.file_index].append(
+                {
+                    "text": text,
+                    "start": round(chunk.start, 3),
+                    "end": round(chunk.end, 3),
+                }
+            )
+
+    logger.info(f"Упакованный ASR: {len(chunks)} кусков речи из {len(audios)} файлов")
+    return segments_by_file
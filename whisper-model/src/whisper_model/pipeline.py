@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+from typing import Callable, Generic, Iterable, Iterator, List, Tuple, TypeVar
+
+logger = logging.getLogger("whisper-model")
+
+T = TypeVar("T")
+
+_STOP = object()
+_POLL_INTERVAL_S = 0.1
+
+
+class StagePipeline(Generic[T]):
+    """Конвейер из последовательных этапов, у каждого свой поток и своя очередь.
+
+    Пока этап N обрабатывает элемент i, этап N-1 уже работает над элементом i+1.
+    Очереди ограничены queue_size, поэтому быстрый этап (декодирование) не
+    уходит вперед больше чем на queue_size элементов и память остается ограниченной.
+    Этап изменяет элемент на месте; элемент, на котором этап упал, проходит
+    оставшиеся этапы без обработки и возвращается с ошибкой.
+    """
+
+    def __init__(
+        self,
+        stages: List[Tuple[str, Callable[[T], None]]],
+        queue_size: int,
+        is_done: Callable[[T], bool],
+        on_error: Callable[[T, Exception], None],
+    ):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.is_done = is_done
+        self.on_error = on_error
+
+    def run(self, items: Iterable[T]) -> Iterator[T]:
+        stop_event = threading.Event()
+        queues: List[queue.Queue] = [
+            queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)
+        ]
+
+        threads = [
+            threading.Thread(
+                target=self._feed,
+                args=(items, queues[0], stop_event),
+                name="pipeline-feed",
+                daemon=True,
+            )
+        ]
+        for i, (stage_name, stage) in enumerate(self.stages):
+            threads.append(
+                threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[i], queues[i + 1], stop_event),
+                    name=f"pipeline-{stage_name}",
+                    daemon=True,
+                )
+            )
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1], stop_event)
+                if item is _STOP:
+                    return
+                yield item
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def _feed(self, items: Iterable[T], out_queue: queue.Queue, stop_event):
+        try:
+            for item in items:
+                if not self._put(out_queue, item, stop_event):
+                    return
+        finally:
+            self._put(out_queue, _STOP, stop_event)
+
+    def _work(self, stage, in_queue: queue.Queue, out_queue: queue.Queue, stop_event):
+        while True:
+            item = self._get(in_queue, stop_event)
+            if item is _STOP:
+                self._put(out_queue, _STOP, stop_event)
+                return
+
+            if not self.is_done(item):
+                try:
+                    stage(item)
+                except Exception as e:
+                    logger.exception(f"Ошибка на этапе конвейера: {e}")
+                    self.on_error(item, e)
+
+            if not self._put(out_queue, item, stop_event):
+                return
+
+    @staticmethod
+    def _put(out_queue: queue.Queue, item, stop_event: threading.Event) -> bool:
+        while not stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=_POLL_INTERVAL_S)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _get(in_queue: queue.Queue, stop_event: threading.Event):
+        while not stop_event.is_set():
+            try:
+                return in_queue.get(timeout=_POLL_INTERVAL_S)
+            except queue.Empty:
+                continue
+        return _STOP
@@ -0,0 +1,188 @@
+import gc
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
+
+import torch
+
+from .loading import LazyResource
+
+logger = logging.getLogger("whisper-model")
+
+RegistryKey = Tuple[str, str]
+
+
+def registry_key(kind: str, config: Dict[str, Any]) -> RegistryKey:
+    return kind, json.dumps(config, sort_keys=True, default=str)
+
+
+def estimate_model_bytes(model: Any) -> int:
+    """Оценка памяти модели по ее параметрам и буферам torch.
+
+    У моделей без torch-параметров (CTranslate2 у faster-whisper) размер
+    берется из замера свободной памяти устройства при загрузке.
+    """
+    if isinstance(model, (tuple, list)):
+        return sum(estimate_model_bytes(item) for item in model)
+
+    module = getattr(model, "model", model)
+    if isinstance(module, torch.nn.Module):
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    return 0
+
+
+def _device_used_bytes() -> int:
+    if not torch.cuda.is_available():
+        return 0
+    free, total = torch.cuda.mem_get_info()
+    return total - free
+
+
+@dataclass
+class _RegistryEntry:
+    resource: LazyResource
+    refcount: int = 0
+    size_bytes: int = 0
+
+
+class ModelRegistry:
+    """Кэш загруженных моделей процесса с подсчетом ссылок.
+
+    Модели ищутся по ключу из вида модели и ее конфигурации, поэтому несколько
+    WhisperXModel с одинаковыми AlignConfig/SegmentationConfig делят одни и те
+    же загруженные модели. Неиспользуемые модели (refcount == 0) остаются в
+    кэше и вытесняются в порядке LRU, когда суммарный размер превышает бюджет.
+    """
+
+    def __init__(self, budget_bytes: int | None = None):
+        self.budget_bytes = budget_bytes
+        self._entries: OrderedDict[RegistryKey, _RegistryEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_budget(self, budget_bytes: int | None) -> None:
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            evicted = self._evict_idle()
+        self._free(evicted)
+
+    def acquire(self, key: RegistryKey, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _RegistryEntry(
+                    resource=LazyResource(
+                        key[0],
+                        lambda: self._measured_load(loader),
+                        log_level=logging.DEBUG,
+                    )
+                )
+                self._entries[key] = entry
+            else:
+                logger.info(f"Модель {key[0]} взята из реестра загруженных моделей")
+            entry.refcount += 1
+            self._entries.move_to_end(key)
+
+        try:
+            model, size_bytes = entry.resource.get()
+        except Exception:
+            with self._lock:
+                entry.refcount -= 1
+                if entry.refcount == 0 and not entry.resource.ready:
+                    self._entries.pop(key, None)
+            raise
+
+        with self._lock:
+            entry.size_bytes = size_bytes
+            evicted = self._evict_idle()
+        self._free(evicted)
+        return model
+
+    def release(self, key: RegistryKey, unload: bool = False) -> None:
+        """Отпускает модель; при unload неиспользуемая модель выгружается сразу."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refcount == 0:
+                return
+            entry.refcount -= 1
+            if unload and entry.refcount == 0:
+                evicted = [self._entries.pop(key)]
+            else:
+                evicted = self._evict_idle()
+        self._free(evicted)
+
+    def unload(self, key: RegistryKey) -> None:
+        """Выгружает модель, если она никем не используется."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refcount > 0:
+                return
+            evicted = [self._entries.pop(key)]
+        self._free(evicted)
+
+    def clear(self) -> None:
+        """Выгружает все неиспользуемые модели."""
+        with self._lock:
+            evicted = [
+                self._entries.pop(key)
+                for key, entry in list(self._entries.items())
+                if entry.refcount == 0
+            ]
+        self._free(evicted)
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._entries.values())
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                f"{kind}:{config}": {
+                    "refcount": entry.refcount,
+                    "size_bytes": entry.size_bytes,
+                }
+                for (kind, config), entry in self._entries.items()
+            }
+
+    @staticmethod
+    def _measured_load(loader: Callable[[], Any]) -> Tuple[Any, int]:
+        used_before = _device_used_bytes()
+        model = loader()
+        size_bytes = estimate_model_bytes(model) or max(
+            0, _device_used_bytes() - used_before
+        )
+        return model, size_bytes
+
+    def _evict_idle(self) -> list:
+        if self.budget_bytes is None:
+            return []
+
+        total = sum(entry.size_bytes for entry in self._entries.values())
+        evicted = []
+        for key, entry in list(self._entries.items()):
+            if total <= self.budget_bytes:
+                break
+            if entry.refcount > 0:
+                continue
+            evicted.append(self._entries.pop(key))
+            total -= entry.size_bytes
+            logger.info(
+                f"Модель {key[0]} выгружена из реестра ({entry.size_bytes / 2**20:.0f} МБ)"
+            )
+        return evicted
+
+    @staticmethod
+    def _free(evicted: list) -> None:
+        if not evicted:
+            return
+        evicted.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+MODEL_REGISTRY = ModelRegistry()
@@ -0,0 +1,124 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from pyannote.audio import Inference
+from pyannote.audio.utils.signal import Peak
+from pyannote.core import Segment, SlidingWindow, SlidingWindowFeature, Timeline
+
+from .audio import SAMPLE_RATE
+from .config import PeakConfig
+
+logger = logging.getLogger("whisper-model")
+
+
+@dataclass
+class _FileChunks:
+    num_samples: int
+    num_chunks: int
+    # Последний кусок файла короче окна и дополнен нулями
+    has_last_chunk: bool
+
+
+def _file_chunks(
+    waveform: torch.Tensor, window_size: int, step_size: int
+) -> Tuple[torch.Tensor, _FileChunks]:
+    """Куски одного файла так же, как их режет Inference.slide."""
+    _, num_samples = waveform.shape
+    chunks = []
+    num_complete = 0
+    if num_samples >= window_size:
+        complete = waveform.unfold(1, window_size, step_size).permute(1, 0, 2)
+        num_complete = complete.shape[0]
+        chunks.append(complete)
+
+    has_last_chunk = (num_samples < window_size) or (
+        num_samples - window_size
+    ) % step_size > 0
+    if has_last_chunk:
+        last_chunk = waveform[:, num_complete * step_size :]
+        last_chunk = F.pad(last_chunk, (0, window_size - last_chunk.shape[1]))
+        chunks.append(last_chunk[None])
+
+    return torch.cat(chunks), _FileChunks(
+        num_samples=num_samples,
+        num_chunks=num_complete + has_last_chunk,
+        has_last_chunk=has_last_chunk,
+    )
+
+
+def segment_many(
+    inference: Inference,
+    audios: List[np.ndarray],
+    peak_config: PeakConfig,
+    batch_size: int | None = None,
+) -> List[Timeline]:
+    """Смены спикера для нескольких файлов общими проходами модели.
+
+    Каждый файл режется на окна pyannote отдельно, окна всех файлов идут в
+    модель батчами batch_size (по умолчанию inference.batch_size), затем
+    агрегируются и проходят Peak по каждому файлу. В отличие от сегментации
+    склеенной записи, тишина между файлами не обрабатывается и нет окон,
+    захватывающих два файла.
+    Результат для файла совпадает с Inference + Peak по этому файлу.
+    """
+    if not audios:
+        return []
+
+    window_size = inference.model.audio.get_num_samples(inference.duration)
+    step_size = round(inference.step * SAMPLE_RATE)
+
+    file_chunks: List[torch.Tensor] = []
+    layout: List[_FileChunks] = []
+    for audio in audios:
+        waveform = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))
+        chunks, file_layout = _file_chunks(waveform[None], window_size, step_size)
+        file_chunks.append(chunks)
+        layout.append(file_layout)
+    all_chunks = torch.cat(file_chunks)
+
+    # Inference общий для всех потоков, поэтому batch_size передается, а не меняется на нем
+    batch_size = batch_size or inference.batch_size
+    outputs = []
+    for start in range(0, all_chunks.shape[0], batch_size):
+        batch_outputs = inference.infer(all_chunks[start : start + batch_size])
+        if isinstance(batch_outputs, tuple):
+            raise ValueError(
+                "Модель сегментации с несколькими выходами не поддерживается"
+            )
+        outputs.append(batch_outputs)
+    outputs = np.vstack(outputs)
+
+    chunk_window = SlidingWindow(
+        start=0.0, duration=inference.duration, step=inference.step
+    )
+    frames = inference.model.example_output.frames
+    peak = Peak(**peak_config.model_dump())
+
+    timelines = []
+    offset = 0
+    for file_layout in layout:
+        file_outputs = outputs[offset : offset + file_layout.num_chunks]
+        offset += file_layout.num_chunks
+        if inference.pre_aggregation_hook is not None:
+            file_outputs = inference.pre_aggregation_hook(file_outputs)
+
+        aggregated = Inference.aggregate(
+            SlidingWindowFeature(file_outputs, chunk_window),
+            frames=frames,
+            warm_up=inference.warm_up,
+            hamming=True,
+            missing=0.0,
+        )
+        if file_layout.has_last_chunk:
+            aggregated.data = aggregated.crop(
+                Segment(0.0, file_layout.num_samples / SAMPLE_RATE), mode="loose"
+            )
+
+        aggregated.labels = ["SPEAKER_CHANGE"]
+        timelines.append(peak(aggregated))
+
+    return timelines
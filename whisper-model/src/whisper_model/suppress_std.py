@@ -2,30 +2,49 @@ import contextlib
 import io
 import logging
 import sys
+import threading
 
 
 class SuppressStd(contextlib.ContextDecorator):
+    # Подмена sys.stdout глобальна для процесса, поэтому вложенные и параллельные
+    # (из потоков конвейера) входы разделяют один буфер: подменяет первый вход,
+    # восстанавливает и пишет накопленный вывод в лог последний выход
+    _lock = threading.Lock()
+    _depth = 0
+    _stdout = None
+    _stderr = None
+    _stringio: io.StringIO | None = None
+
     def __init__(self, logger: logging.Logger, level=logging.INFO):
         self.logger = logger
         self.level = level
-        self._stdout = None
-        self._stderr = None
-        self._stringio = None
 
     def __enter__(self):
-        self._stdout = sys.stdout
-        self._stderr = sys.stderr
-        self._stringio = io.StringIO()
-        sys.stdout = self._stringio
-        sys.stderr = self._stringio
+        cls = SuppressStd
+        with cls._lock:
+            if cls._depth == 0:
+                cls._stdout = sys.stdout
+                cls._stderr = sys.stderr
+                cls._stringio = io.StringIO()
+                sys.stdout = cls._stringio
+                sys.stderr = cls._stringio
+            cls._depth += 1
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        sys.stdout = self._stdout
-        sys.stderr = self._stderr
-        output = self._stringio.getvalue() if self._stringio else None
+        cls = SuppressStd
+        with cls._lock:
+            cls._depth -= 1
+            if cls._depth > 0:
+                return False
+
+            sys.stdout = cls._stdout
+            sys.stderr = cls._stderr
+            output = cls._stringio.getvalue() if cls._stringio else None
+            if cls._stringio:
+                cls._stringio.close()
+            cls._stringio = None
+
         if output:
             self.logger.log(self.level, output.strip())
-        if self._stringio:
-            self._stringio.close()
         return False
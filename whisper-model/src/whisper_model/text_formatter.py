@@ -1,11 +1,12 @@
-from typing import List
+from typing import TYPE_CHECKING, List
 
-from whisperx.alignment import SingleWordSegment
+if TYPE_CHECKING:
+    from whisperx.alignment import SingleWordSegment
 
 
 class TextFormatter:
     @staticmethod
-    def format_segments(grouped_word_segments: List[List[SingleWordSegment]]) -> str:
+    def format_segments(grouped_word_segments: List[List["SingleWordSegment"]]) -> str:
         if not grouped_word_segments:
             return ""
 
@@ -1,22 +1,61 @@
 import logging
-import tempfile
+import math
+import threading
 import time
-from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass, field
+from itertools import groupby
 from os import getenv
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
 
-import librosa
 import numpy as np
 import torch
 import whisperx
 from pyannote.audio import Inference
 from pyannote.audio.utils.signal import Peak
 from pyannote.core import Segment, SlidingWindowFeature, Timeline
-from scipy.io import wavfile as scipy_wavfile
-from whisperx.alignment import SingleAlignedSegment, SingleWordSegment
 
-from .config import WhisperXConfig
+from .alignment import AlignerPool, align_batched
+from .audio import (
+    SAMPLE_RATE,
+    AudioLoader,
+    ConcatAudio,
+    SilenceMap,
+    compress_silence,
+    quietest_point,
+)
+from .batch_tuning import (
+    SAFE_BATCH_SIZES,
+    BatchKey,
+    BatchOutOfMemoryError,
+    is_out_of_memory,
+    oom_stage,
+    pick_batch_size,
+    release_memory,
+)
+from .cache import CacheStats, TranscriptionCache, config_hash
+from .config import LoadConfig, SegmentationConfig, WhisperConfig, WhisperXConfig
+from .cpu import apply_cpu_budget, plan_cpu_budget
+from .intervals import (
+    assign_words_to_segments,
+    decompose_segments,
+    decompose_words,
+    plan_stream_chunks,
+    remap_timeline,
+    remap_words,
+    segment_as_word,
+    segments_near_changes,
+    select_words_in_range,
+    shift_words,
+    stitch_timeline_piece,
+)
+from .loading import LazyResource
+from .packed_asr import transcribe_packed
+from .pipeline import StagePipeline
+from .registry import MODEL_REGISTRY, RegistryKey, registry_key
+from .segmentation import segment_many
 from .suppress_std import SuppressStd
 from .text_formatter import TextFormatter
 
@@ -25,22 +64,108 @@ logger = logging.getLogger("whisper-model")
 HF_TOKEN = getenv("HF_TOKEN")
 
 
+def _speaker_change_scores(scores: np.ndarray) -> np.ndarray:
+    # Оценка смены спикера в кадре - максимальный по спикерам скачок вероятности
+    return np.max(np.abs(np.diff(scores, n=1, axis=1)), axis=2, keepdims=True)
+
+
 @dataclass
 class TranscriptionMetrics:
+    decode_time: float
     transcribe_time: float
     align_time: float
     segmentation_time: float
+    wall_time: float
+    # Секунды тишины, вырезанные перед ASR
+    saved_audio_s: float
+    # Доля сегментов Whisper, прошедших выравнивание; 0 - выравнивание пропущено
+    aligned_fraction: float
 
     def __init__(self, metrics: Dict[str, float]):
+        self.decode_time = metrics.get("decode_time", 0)
         self.transcribe_time = metrics.get("transcribe_time", 0)
         self.align_time = metrics.get("align_time", 0)
         self.segmentation_time = metrics.get("segmentation_time", 0)
+        self.wall_time = metrics.get("wall_time", 0)
+        self.aligned_fraction = metrics.get("aligned_fraction", 1.0)
+        self.saved_audio_s = metrics.get("saved_audio_s", 0)
+
+    @property
+    def stages_time(self) -> float:
+        """Сумма времен этапов; при параллельной сегментации больше wall_time."""
+        return (
+            self.decode_time
+            + self.transcribe_time
+            + self.align_time
+            + self.segmentation_time
+        )
 
 
 @dataclass
 class TranscriptionResult:
     text: str
     metrics: TranscriptionMetrics
+    cached: bool = False
+    language: str | None = None
+
+
+@dataclass
+class TranscriptionChunk:
+    text: str
+    start: float
+    end: float
+    metrics: TranscriptionMetrics
+
+
+@dataclass
+class FileTranscription:
+    audio_path: Path
+    result: TranscriptionResult | None = None
+    error: Exception | None = None
+
+
+@dataclass
+class _FileJob:
+    audio_path: Path
+    metrics: Dict[str, float] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.monotonic)
+    cache_key: str | None = None
+    audio: np.ndarray | None = None
+    segments: List[Dict[str, Any]] | None = None
+    language: str | None = None
+    silence_map: SilenceMap | None = None
+    word_segments: List[Dict[str, Any]] | None = None
+    timeline: Timeline | None = None
+    result: TranscriptionResult | None = None
+    error: Exception | None = None
+
+
+def whisper_registry_key(whisper_config: WhisperConfig) -> RegistryKey:
+    return registry_key(
+        "whisper", whisper_config.model_dump(exclude={"transcribe_options"})
+    )
+
+
+def segmentation_registry_key(segmentation_config: SegmentationConfig) -> RegistryKey:
+    return registry_key(
+        "segmentation",
+        segmentation_config.model_dump(exclude={"peak_config", "batch_across_files"}),
+    )
+
+
+def config_registry_keys(config: WhisperXConfig) -> List[RegistryKey]:
+    """Ключи реестра моделей, которые загрузит WhisperXModel с этой конфигурацией.
+
+    Модели не загружаются. Для выравнивания - модель языка по умолчанию, модели
+    других языков при language_routing заранее неизвестны.
+    """
+    return [
+        whisper_registry_key(config.whisper_config),
+        segmentation_registry_key(config.segmentation_config),
+        AlignerPool(config.align_config).registry_key(
+            config.align_config.language_code
+        ),
+    ]
 
 
 class WhisperXModel:
@@ -48,78 +173,645 @@ class WhisperXModel:
         self.whisper_config = config.whisper_config
         self.align_config = config.align_config
         self.segmentation_config = config.segmentation_config
+        self.pipeline_config = config.pipeline_config
+        self.stream_config = config.stream_config
+        self.long_audio_config = config.long_audio_config
+        self.batch_config = config.batch_config
+        self.silence_config = config.silence_config
+        self.batch_tuning_config = config.batch_tuning_config
+        self.audio_loader = AudioLoader(config.audio_config)
+        if config.device == "cpu":
+            apply_cpu_budget(
+                config.cpu_config,
+                plan_cpu_budget(
+                    config.cpu_config, self.pipeline_config.concurrent_segmentation
+                ),
+            )
+        self.cache = (
+            TranscriptionCache(config.cache_config, config_hash(config))
+            if config.cache_config.enabled
+            else None
+        )
+
+        self._acquired_keys: List[RegistryKey] = []
+        self._acquired_lock = threading.Lock()
+        if config.load_config.registry_budget_mb is not None:
+            MODEL_REGISTRY.set_budget(config.load_config.registry_budget_mb * 2**20)
+
+        self._whisper_resource = LazyResource(
+            "whisper",
+            lambda: self._acquire(
+                whisper_registry_key(self.whisper_config), self._load_whisper_model
+            ),
+        )
+        self.aligner_pool = AlignerPool(self.align_config)
+        self._align_resource = LazyResource("align", self.aligner_pool.get)
+        self._segmentation_resource = LazyResource(
+            "segmentation",
+            lambda: self._acquire(
+                segmentation_registry_key(self.segmentation_config),
+                self._load_segmentation_model,
+            ),
+        )
+        self._load_executor: ThreadPoolExecutor | None = None
+        self._start_loading(config.load_config)
+
+        self._segmentation_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="segmentation")
+            if self.pipeline_config.concurrent_segmentation
+            else None
+        )
+
+    def _acquire(self, key: RegistryKey, loader: Callable[[], Any]) -> Any:
+        model = MODEL_REGISTRY.acquire(key, loader)
+        with self._acquired_lock:
+            self._acquired_keys.append(key)
+        return model
+
+    def close(self) -> None:
+        """Отпускает модели в реестр процесса.
+
+        Модели остаются загруженными и достаются следующему WhisperXModel с
+        такой же конфигурацией, пока реестр не вытеснит их по бюджету памяти.
+        """
+        if self._load_executor is not None:
+            self._load_executor.shutdown(wait=True)
+        if self._segmentation_executor is not None:
+            self._segmentation_executor.shutdown(wait=True)
+
+        with self._acquired_lock:
+            acquired_keys, self._acquired_keys = self._acquired_keys, []
+        for key in acquired_keys:
+            MODEL_REGISTRY.release(key)
+        self.aligner_pool.close()
+
+    @property
+    def registry_keys(self) -> List[RegistryKey]:
+        """Ключи моделей реестра, которые взял этот экземпляр."""
+        with self._acquired_lock:
+            acquired_keys = list(self._acquired_keys)
+        return acquired_keys + self.aligner_pool.registry_keys
+
+    def __enter__(self) -> "WhisperXModel":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    @property
+    def _resources(self) -> List[LazyResource]:
+        return [
+            self._whisper_resource,
+            self._align_resource,
+            self._segmentation_resource,
+        ]
+
+    def _start_loading(self, load_config: LoadConfig) -> None:
+        if load_config.mode == "lazy":
+            return
+
+        if load_config.parallel or load_config.mode == "background":
+            self._load_executor = ThreadPoolExecutor(
+                max_workers=len(self._resources) if load_config.parallel else 1,
+                thread_name_prefix="model-load",
+            )
+            futures = [
+                resource.start(self._load_executor) for resource in self._resources
+            ]
+            if load_config.mode == "eager":
+                for future in futures:
+                    future.result()
+            return
+
+        for resource in self._resources:
+            resource.get()
+
+    @property
+    def load_times(self) -> Dict[str, float]:
+        """Время загрузки уже загруженных моделей по имени."""
+        return {
+            resource.name: resource.load_time
+            for resource in self._resources
+            if resource.load_time is not None
+        }
+
+    def ready_models(self) -> List[str]:
+        return [resource.name for resource in self._resources if resource.ready]
+
+    def wait_until_ready(self) -> None:
+        for resource in self._resources:
+            resource.get()
+
+    @property
+    def whisper_model(self):
+        return self._whisper_resource.get()
 
+    @property
+    def align_model(self):
+        return self._align_resource.get()[0]
+
+    @property
+    def align_metadata(self):
+        return self._align_resource.get()[1]
+
+    @property
+    def segmentation_model(self) -> Inference:
+        return self._segmentation_resource.get()
+
+    def _load_whisper_model(self):
         with SuppressStd(logger):
             whisper_model = whisperx.load_model(
                 **self.whisper_config.model_dump(exclude={"transcribe_options"})
             )
-            logger.info(
-                f"WhisperX {self.whisper_config.whisper_arch} loaded with config: {self.whisper_config.model_dump()}"
-            )
-            align_model, metadata = whisperx.load_align_model(
-                **self.align_config.model_dump()
-            )
-            logger.info(
-                f"WhisperX Align model {self.align_config.model_name or 'default'} loaded with config: {self.align_config.model_dump()}"
+        logger.info(
+            f"WhisperX {self.whisper_config.whisper_arch} loaded with config: {self.whisper_config.model_dump()}"
+        )
+        return whisper_model
+
+    def _load_segmentation_model(self) -> Inference:
+        inference_kwargs = self.segmentation_config.model_dump(
+            include={"model", "batch_size", "step"}
+        )
+        with SuppressStd(logger):
+            if self.segmentation_config.backend == "onnx":
+                from .onnx_segmentation import OnnxInference
+
+                segmentation_model = OnnxInference(
+                    **inference_kwargs,
+                    onnx_path=self.segmentation_config.onnx_path,
+                    quantize=self.segmentation_config.onnx_quantize,
+                    intra_op_threads=self.segmentation_config.intra_op_threads,
+                    inter_op_threads=self.segmentation_config.inter_op_threads,
+                    pre_aggregation_hook=_speaker_change_scores,
+                )
+            else:
+                segmentation_model = Inference(
+                    **inference_kwargs,
+                    device=torch.device(self.segmentation_config.device),
+                    pre_aggregation_hook=_speaker_change_scores,
+                )
+        logger.info(
+            f"Segmentation model {self.segmentation_config.model} loaded with config: {self.segmentation_config.model_dump()}"
+        )
+        return segmentation_model
+
+    def _align(
+        self,
+        segments: List[Dict[str, Any]],
+        audio: np.ndarray,
+        language: str | None,
+    ) -> Dict[str, Any]:
+        # Модель выравнивания берется по языку, который определил Whisper
+        # (при align_config.language_routing)
+        align_model, align_metadata = self.aligner_pool.get(language)
+        if self.align_config.batch_size:
+            return align_batched(
+                segments,
+                align_model,
+                align_metadata,
+                audio,
+                self.align_config.device,
+                self.align_config.batch_size,
             )
+        return whisperx.align(
+            segments,
+            align_model,
+            align_metadata,
+            audio,
+            self.align_config.device,
+        )
 
-            segmentation_model = Inference(
-                **self.segmentation_config.model_dump(
-                    exclude={"device", "peak_config"}
-                ),
-                device=torch.device(self.segmentation_config.device),
-                pre_aggregation_hook=lambda p: np.max(
-                    np.abs(np.diff(p, n=1, axis=1)), axis=2, keepdims=True
-                ),
+    def _align_near_changes(
+        self,
+        segments: List[Dict[str, Any]],
+        audio: np.ndarray,
+        language: str | None,
+        timeline: Timeline,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+        """Выравнивание в режиме align_config.mode.
+
+        В adaptive режиме выравниваются только сегменты Whisper рядом со сменами
+        спикера: остальные целиком попадают в одну реплику, и слова для них не
+        нужны. Без смен спикера wav2vec2 не запускается. Возвращает сегменты в
+        формате whisperx.align и метрики align_time, aligned_fraction.
+        """
+        if self.align_config.mode == "full":
+            aligned_result, align_time = self._measured_call(
+                lambda: self._align(segments, audio, language)
             )
-            logger.info(
-                f"Segmentation model {self.segmentation_config.model} loaded with config: {self.segmentation_config.model_dump()}"
+            return aligned_result["segments"], {
+                "align_time": align_time,
+                "aligned_fraction": 1.0,
+            }
+
+        needs_alignment = segments_near_changes(
+            segments, timeline, self.align_config.change_margin_s
+        )
+        aligned_segments: List[Dict[str, Any]] = []
+        align_time = 0.0
+        # Подряд идущие сегменты рядом со сменой выравниваются одним вызовом
+        for aligned, run in groupby(
+            zip(segments, needs_alignment), key=lambda item: bool(item[1])
+        ):
+            run_segments = [segment for segment, _ in run]
+            if not aligned:
+                aligned_segments.extend(
+                    {**segment, "words": [segment_as_word(segment)]}
+                    for segment in run_segments
+                )
+                continue
+
+            aligned_result, run_time = self._measured_call(
+                lambda: self._align(run_segments, audio, language)
             )
+            align_time += run_time
+            aligned_segments.extend(aligned_result["segments"])
+
+        aligned_fraction = float(needs_alignment.mean()) if segments else 0.0
+        return aligned_segments, {
+            "align_time": align_time,
+            "aligned_fraction": aligned_fraction,
+        }
 
-        self.whisper_model = whisper_model
-        self.align_model = align_model
-        self.align_metadata = metadata
-        self.segmentation_model = segmentation_model
+    @staticmethod
+    def _assign_words(
+        word_segments: List[Dict[str, Any]],
+        timeline: Timeline,
+        silence_map: SilenceMap | None,
+    ) -> List[List[Dict[str, Any]]]:
+        # ASR, выравнивание и сегментация шли по записи со сжатой тишиной:
+        # метки времени возвращаются в шкалу исходного файла
+        if silence_map is not None:
+            word_segments = remap_words(word_segments, silence_map.to_original)
+            timeline = remap_timeline(timeline, silence_map.to_original)
+        return assign_words_to_segments(word_segments, timeline)
 
     def _measured_call(self, func: Callable):
         start = time.monotonic()
         result = func()
         return result, time.monotonic() - start
 
+    def _start_segmentation(
+        self, audio: Any, segment: Callable[[Any], Any] | None = None
+    ) -> Future | None:
+        # Сегментация зависит только от аудио, поэтому при concurrent_segmentation
+        # она запускается сразу после декодирования параллельно с ASR
+        if self._segmentation_executor is None:
+            return None
+        segment = segment or self._perfom_segmentation
+        return self._segmentation_executor.submit(
+            self._measured_call, lambda: segment(audio)
+        )
+
+    def _finish_segmentation(
+        self,
+        audio: Any,
+        segmentation_future: Future | None,
+        segment: Callable[[Any], Any] | None = None,
+    ) -> Tuple[Any, float]:
+        if segmentation_future is not None:
+            return segmentation_future.result()
+        segment = segment or self._perfom_segmentation
+        return self._measured_call(lambda: segment(audio))
+
+    @property
+    def cache_stats(self) -> CacheStats | None:
+        return self.cache.stats if self.cache else None
+
+    def _cached_result(self, cache_key: str) -> TranscriptionResult | None:
+        if not self.cache:
+            return None
+        cached_text = self.cache.get(cache_key)
+        if cached_text is None:
+            return None
+        return TranscriptionResult(
+            text=cached_text, metrics=TranscriptionMetrics({}), cached=True
+        )
+
     def transcribe(self, audio_path: Path) -> TranscriptionResult:
-        transcription_options = self.whisper_config.transcribe_options.model_dump()
+        if not self.cache:
+            return self._transcribe(audio_path)
+
+        cache_key = self.cache.key(audio_path)
+        cached_result = self._cached_result(cache_key)
+        if cached_result:
+            return cached_result
+
+        result = self._transcribe(audio_path)
+        self.cache.put(cache_key, result.text)
+        return result
+
+    def _is_long(self, audio_path: Path) -> bool:
+        """Включать ли для файла оконный режим long_audio_config."""
+        if not self.long_audio_config.enabled:
+            return False
+        duration_s = self.audio_loader.probe_duration(audio_path)
+        return bool(duration_s and duration_s > self.long_audio_config.threshold_s)
+
+    def _transcribe(self, audio_path: Path) -> TranscriptionResult:
+        if self._is_long(audio_path):
+            return self.transcribe_long(audio_path)
+
+        job = _FileJob(audio_path)
+
+        with SuppressStd(logger):
+            self._decode_stage(job)
+            segmentation_future = self._start_segmentation(job.audio)
+            self._transcribe_stage(job)
+            job.timeline, job.metrics["segmentation_time"] = self._finish_segmentation(
+                job.audio, segmentation_future
+            )
+            self._align_stage(job)
+            self._format_stage(job)
+
+        return job.result
+
+    def transcribe_many(
+        self, audio_paths: Iterable[Path]
+    ) -> Iterator[FileTranscription]:
+        """Конвейерная обработка потока файлов.
+
+        Декодирование, ASR, выравнивание, сегментация и форматирование идут в
+        отдельных потоках с ограниченными очередями между ними: пока файл N
+        выравнивается и сегментируется, файл N+1 уже декодируется и
+        транскрибируется. Результаты отдаются по мере готовности.
+        """
+        # Вывод подавляется только на время работы этапов, а не между выдачей
+        # результатов: вызывающий код может печатать и бросить генератор на середине
+        suppress_std = SuppressStd(logger)
+        pipeline: StagePipeline[_FileJob] = StagePipeline(
+            stages=[
+                ("decode", suppress_std(self._cached_decode_stage)),
+                ("transcribe", suppress_std(self._transcribe_stage)),
+                ("segmentation", suppress_std(self._segmentation_stage)),
+                ("align", suppress_std(self._align_stage)),
+                ("format", suppress_std(self._cached_format_stage)),
+            ],
+            queue_size=self.pipeline_config.stage_queue_size,
+            is_done=lambda job: job.result is not None or job.error is not None,
+            on_error=self._fail_job,
+        )
+        jobs = (_FileJob(Path(audio_path)) for audio_path in audio_paths)
+
+        for job in pipeline.run(jobs):
+            yield FileTranscription(
+                audio_path=job.audio_path, result=job.result, error=job.error
+            )
+
+    def transcribe_stream(self, audio_path: Path) -> Iterator[TranscriptionChunk]:
+        """Потоковая транскрипция: реплики отдаются по мере готовности.
+
+        Сначала по всей записи считается сегментация (она дешевле ASR), затем
+        запись режется на куски по сменам спикера и каждый кусок проходит ASR и
+        выравнивание отдельно. wall_time в метриках куска - время от начала
+        обработки файла, у первого куска это время до первого текста.
+        """
+        started_at = time.monotonic()
         metrics: Dict[str, float] = {}
 
         with SuppressStd(logger):
-            audio = whisperx.load_audio(str(audio_path))
-            transcribe_result, metrics["transcribe_time"] = self._measured_call(
-                lambda: self.whisper_model.transcribe(audio, **transcription_options)
+            decoded_audio = self.audio_loader.load(audio_path)
+            metrics["decode_time"] = decoded_audio.decode_time
+            audio = decoded_audio.samples
+            timeline, metrics["segmentation_time"] = self._measured_call(
+                lambda: self._perfom_segmentation(audio)
             )
 
-            aligned_result, metrics["align_time"] = self._measured_call(
-                lambda: whisperx.align(
-                    transcribe_result["segments"],
-                    self.align_model,
-                    self.align_metadata,
-                    audio,
-                    self.align_config.device,
+        chunk_bounds = plan_stream_chunks(
+            timeline,
+            decoded_audio.duration_s,
+            self.stream_config.min_chunk_s,
+            self.stream_config.max_chunk_s,
+            lambda start_s, end_s: quietest_point(audio, start_s, end_s),
+        )
+        transcription_options = self.whisper_config.transcribe_options.model_dump()
+        language = self.whisper_config.language
+
+        for chunk_start, chunk_end in chunk_bounds:
+            chunk_audio = audio[
+                int(chunk_start * SAMPLE_RATE) : int(chunk_end * SAMPLE_RATE)
+            ]
+
+            with SuppressStd(logger):
+                transcribe_result, transcribe_time = self._measured_call(
+                    lambda: self.whisper_model.transcribe(
+                        chunk_audio, language=language, **transcription_options
+                    )
                 )
+                # Язык определяется по первому куску и дальше не переопределяется
+                language = language or transcribe_result.get("language")
+
+                chunk_timeline = Timeline(
+                    segments=[
+                        Segment(segment.start - chunk_start, segment.end - chunk_start)
+                        for segment in timeline.crop(Segment(chunk_start, chunk_end))
+                    ]
+                )
+                aligned_segments, align_metrics = self._align_near_changes(
+                    transcribe_result["segments"], chunk_audio, language, chunk_timeline
+                )
+
+            metrics["transcribe_time"] = (
+                metrics.get("transcribe_time", 0) + transcribe_time
+            )
+            metrics["align_time"] = (
+                metrics.get("align_time", 0) + align_metrics["align_time"]
+            )
+            metrics["aligned_fraction"] = align_metrics["aligned_fraction"]
+
+            word_segments = shift_words(
+                [word for segment in aligned_segments for word in segment["words"]],
+                chunk_start,
+            )
+
+            text = TextFormatter.format_segments(
+                assign_words_to_segments(word_segments, timeline)
+            )
+            if not text:
+                # Метрики куска без текста переносятся в следующий кусок
+                continue
+
+            metrics["wall_time"] = time.monotonic() - started_at
+            yield TranscriptionChunk(
+                text=text,
+                start=chunk_start,
+                end=chunk_end,
+                metrics=TranscriptionMetrics(metrics),
             )
+            metrics = {}
+
+    def transcribe_long(self, audio_path: Path) -> TranscriptionResult:
+        """Транскрипция длинной записи окнами с перекрытием.
+
+        PCM декодируется потоково, в памяти не больше двух окон
+        long_audio_config.window_s. ASR, выравнивание и сегментация идут по окну,
+        результаты сшиваются по швам в середине перекрытий. Вне окрестности
+        overlap_s / 2 от шва результат совпадает с обработкой файла целиком;
+        у шва слово может выпасть или задвоиться, а граница реплики сдвинуться
+        в пределах этой окрестности.
+        """
+        started_at = time.monotonic()
+        metrics: Dict[str, float] = {}
+        transcription_options = self.whisper_config.transcribe_options.model_dump()
+        language = self.whisper_config.language
+        overlap_s = self.long_audio_config.overlap_s
+
+        word_segments: List[Dict[str, Any]] = []
+        aligned_fractions: List[float] = []
+        stitched_segments: List[Segment] = []
+        seam_start = 0.0
+        windows = self.audio_loader.iter_windows(
+            audio_path, self.long_audio_config.window_s, overlap_s
+        )
+
+        while True:
+            window, decode_time = self._measured_call(lambda: next(windows, None))
+            metrics["decode_time"] = metrics.get("decode_time", 0) + decode_time
+            if window is None:
+                break
+            seam_end = np.inf if window.is_last else window.end_s - overlap_s / 2
+
+            with SuppressStd(logger):
+                segmentation_future = self._start_segmentation(window.samples)
+                transcribe_result, transcribe_time = self._measured_call(
+                    lambda: self.whisper_model.transcribe(
+                        window.samples, language=language, **transcription_options
+                    )
+                )
+                language = language or transcribe_result.get("language")
+                window_timeline, segmentation_time = self._finish_segmentation(
+                    window.samples, segmentation_future
+                )
+                aligned_segments, align_metrics = self._align_near_changes(
+                    transcribe_result["segments"],
+                    window.samples,
+                    language,
+                    window_timeline,
+                )
 
-            segmentation_result, metrics["segmentation_time"] = self._measured_call(
-                lambda: self._perfom_segmentation(audio_path)
+            for key, value in (
+                ("transcribe_time", transcribe_time),
+                ("align_time", align_metrics["align_time"]),
+                ("segmentation_time", segmentation_time),
+            ):
+                metrics[key] = metrics.get(key, 0) + value
+            aligned_fractions.append(align_metrics["aligned_fraction"])
+
+            window_words = [
+                word for segment in aligned_segments for word in segment["words"]
+            ]
+            word_segments.extend(
+                select_words_in_range(
+                    shift_words(window_words, window.offset_s),
+                    seam_start,
+                    seam_end,
+                )
             )
-            assigned_result = self._assign_words_to_segments(
-                aligned_result["word_segments"], segmentation_result
+            stitch_timeline_piece(
+                stitched_segments,
+                window_timeline,
+                window.offset_s,
+                seam_start,
+                seam_end,
             )
-            result_text = TextFormatter.format_segments(assigned_result)
+            seam_start = seam_end
+
+        assigned_result = assign_words_to_segments(
+            word_segments, Timeline(segments=stitched_segments)
+        )
+        metrics["aligned_fraction"] = (
+            float(np.mean(aligned_fractions)) if aligned_fractions else 0.0
+        )
+        metrics["wall_time"] = time.monotonic() - started_at
 
         return TranscriptionResult(
-            text=result_text, metrics=TranscriptionMetrics(metrics)
+            text=TextFormatter.format_segments(assigned_result),
+            metrics=TranscriptionMetrics(metrics),
+            language=language,
+        )
+
+    @staticmethod
+    def _fail_job(job: _FileJob, error: Exception) -> None:
+        job.error = error
+        # Освобождаем аудио сразу, а не когда элемент дойдет до конца конвейера
+        job.audio = None
+
+    def _decode_stage(self, job: _FileJob) -> None:
+        job.started_at = time.monotonic()
+        decoded_audio = self.audio_loader.load(job.audio_path)
+        job.metrics["decode_time"] = decoded_audio.decode_time
+        job.audio = decoded_audio.samples
+        if self.silence_config.enabled:
+            (job.audio, job.silence_map), compress_time = self._measured_call(
+                lambda: compress_silence(job.audio, self.silence_config)
+            )
+            job.metrics["decode_time"] += compress_time
+            job.metrics["saved_audio_s"] = job.silence_map.saved_s
+
+    def _cached_decode_stage(self, job: _FileJob) -> None:
+        if self.cache:
+            job.cache_key = self.cache.key(job.audio_path)
+            cached_result = self._cached_result(job.cache_key)
+            if cached_result:
+                job.result = cached_result
+                return
+        if self._is_long(job.audio_path):
+            # Длинный файл целиком проходит оконный режим, остальные этапы он пропускает
+            job.result = self.transcribe_long(job.audio_path)
+            if self.cache and job.cache_key:
+                self.cache.put(job.cache_key, job.result.text)
+            return
+        self._decode_stage(job)
+
+    def _transcribe_stage(self, job: _FileJob) -> None:
+        transcription_options = self.whisper_config.transcribe_options.model_dump()
+        transcribe_result, job.metrics["transcribe_time"] = self._measured_call(
+            lambda: self.whisper_model.transcribe(job.audio, **transcription_options)
+        )
+        job.segments = transcribe_result["segments"]
+        job.language = transcribe_result.get("language")
+
+    def _align_stage(self, job: _FileJob) -> None:
+        aligned_segments, align_metrics = self._align_near_changes(
+            job.segments, job.audio, job.language, job.timeline
+        )
+        job.metrics.update(align_metrics)
+        job.word_segments = [
+            word for segment in aligned_segments for word in segment["words"]
+        ]
+
+    def _segmentation_stage(self, job: _FileJob) -> None:
+        job.timeline, job.metrics["segmentation_time"] = self._measured_call(
+            lambda: self._perfom_segmentation(job.audio)
+        )
+
+    def _format_stage(self, job: _FileJob) -> None:
+        assigned_result = self._assign_words(
+            job.word_segments, job.timeline, job.silence_map
+        )
+        job.audio = None
+        job.metrics["wall_time"] = time.monotonic() - job.started_at
+        job.result = TranscriptionResult(
+            text=TextFormatter.format_segments(assigned_result),
+            metrics=TranscriptionMetrics(job.metrics),
+            language=job.language,
         )
 
-    def _perfom_segmentation(self, audio_path: Path) -> Timeline:
-        segmentation_prob = self.segmentation_model(audio_path)
+    def _cached_format_stage(self, job: _FileJob) -> None:
+        self._format_stage(job)
+        if self.cache and job.cache_key:
+            self.cache.put(job.cache_key, job.result.text)
+
+    @staticmethod
+    def _as_pyannote_input(audio: np.ndarray) -> Dict[str, Any]:
+        # torch.from_numpy не копирует данные: pyannote читает тот же float32 буфер,
+        # что уже декодирован для ASR и выравнивания
+        waveform = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32))
+        return {"waveform": waveform.unsqueeze(0), "sample_rate": SAMPLE_RATE}
+
+    def _perfom_segmentation(self, audio: np.ndarray) -> Timeline:
+        segmentation_prob = self.segmentation_model(self._as_pyannote_input(audio))
         if not isinstance(segmentation_prob, SlidingWindowFeature):
             raise ValueError(
                 f"Segmentation инференс вернул не SlidingWindowFeature, а {type(segmentation_prob)}"
@@ -131,270 +823,481 @@ class WhisperXModel:
 
         return segments_timeline
 
-    def _assign_words_to_segments(
-        self, word_segments: List[SingleWordSegment], segments_timeline: Timeline
-    ) -> List[List[SingleWordSegment]]:
-        segments = []
-        current_segment = []
-        current_segment_index = 0
+    def _segment_files(
+        self, concat_audio: ConcatAudio
+    ) -> Tuple[Timeline, Dict[str, Timeline]]:
+        """Сегментация файлов батча: временная шкала склеенной записи и шкалы файлов."""
+        batch_size = self._segmentation_batch_size(
+            len(concat_audio.samples) / SAMPLE_RATE
+        )
+        with self._oom_stage(self._segmentation_batch_key, batch_size):
+            return self._segment_files_with(concat_audio, batch_size)
+
+    def _segment_files_with(
+        self, concat_audio: ConcatAudio, batch_size: int
+    ) -> Tuple[Timeline, Dict[str, Timeline]]:
+        file_names = concat_audio.file_names
+        file_starts = concat_audio.starts_s
+        inference = self.segmentation_model
+        peak_config = self.segmentation_config.peak_config
+
+        # Без пауз между файлами (vad_chunks) склеенную запись сегментировать нельзя
+        per_file = (
+            self.segmentation_config.batch_across_files
+            or self.batch_config.mode == "vad_chunks"
+        )
+        if not per_file:
+            if batch_size == inference.batch_size:
+                concat_timeline = self._perfom_segmentation(concat_audio.samples)
+            else:
+                # Подобранный batch_size отличается от настроенного в общем Inference
+                (concat_timeline,) = segment_many(
+                    inference, [concat_audio.samples], peak_config, batch_size
+                )
+            timelines_by_file = decompose_segments(
+                file_names, file_starts, concat_audio.durations_s, concat_timeline
+            )
+            return concat_timeline, timelines_by_file
 
-        for i, word in enumerate(word_segments):
-            if word.get("end") is None:
-                current_segment.append(word)
-                continue
+        file_timelines = segment_many(
+            inference,
+            [concat_audio.file_samples(index) for index in range(len(file_names))],
+            peak_config,
+            batch_size,
+        )
+        concat_timeline = Timeline(
+            segments=[
+                Segment(segment.start + file_start, segment.end + file_start)
+                for timeline, file_start in zip(file_timelines, file_starts)
+                for segment in timeline
+            ]
+        )
+        return concat_timeline, dict(zip(file_names, file_timelines))
+
+    @property
+    def _whisper_batch_key(self) -> BatchKey:
+        config = self.whisper_config
+        return "whisper", f"{config.whisper_arch}:{config.compute_type}:{config.device}"
+
+    @property
+    def _segmentation_device(self) -> str:
+        if self.segmentation_config.backend == "onnx":
+            return "cpu"
+        return self.segmentation_config.device
+
+    @property
+    def _segmentation_batch_key(self) -> BatchKey:
+        config = self.segmentation_config
+        return (
+            "segmentation",
+            f"{config.model}:{config.backend}:{self._segmentation_device}",
+        )
 
-            if (
-                word["end"] > segments_timeline[current_segment_index].end
-                or i == len(word_segments) - 1
-            ):
-                segments.append(current_segment)
-                current_segment = []
-                current_segment_index += 1
+    def _whisper_batch_size(self, audio_duration_s: float) -> int | None:
+        return pick_batch_size(
+            self.batch_tuning_config,
+            self._whisper_batch_key,
+            self.whisper_config.device,
+            self.whisper_config.transcribe_options.batch_size,
+            math.ceil(audio_duration_s / self.batch_config.chunk_size_s),
+            self.batch_tuning_config.whisper_item_mb,
+            self.batch_tuning_config.max_whisper_batch_size,
+        )
 
-            current_segment.append(word)
+    def _segmentation_batch_size(self, audio_duration_s: float) -> int:
+        return pick_batch_size(
+            self.batch_tuning_config,
+            self._segmentation_batch_key,
+            self._segmentation_device,
+            self.segmentation_config.batch_size,
+            int(audio_duration_s / self.segmentation_config.step) + 1,
+            self.batch_tuning_config.segmentation_item_mb,
+            self.batch_tuning_config.max_segmentation_batch_size,
+        )
 
-        return segments
+    def _oom_stage(
+        self, key: BatchKey, batch_size: int | None
+    ) -> AbstractContextManager:
+        if not self.batch_tuning_config.split_on_oom:
+            return nullcontext()
+        return oom_stage(key, batch_size)
 
     def transcribe_batch(
         self, audio_paths: List[Path], silence_duration_s: float = 2.0
     ) -> Dict[str, TranscriptionResult]:
-        metrics: Dict[str, float] = {}
-        concat_audio_path, concat_audio_data, original_files_info = (
-            self._create_concat_audio(audio_paths, silence_duration_s)
+        if not self.cache:
+            return self._transcribe_batch_splitting(audio_paths, silence_duration_s)
+
+        results: Dict[str, TranscriptionResult] = {}
+        # Одинаковые файлы внутри батча транскрибируются один раз
+        missed_names_by_key: Dict[str, List[str]] = {}
+        missed_paths: List[Path] = []
+
+        for audio_path in audio_paths:
+            cache_key = self.cache.key(audio_path)
+            cached_result = self._cached_result(cache_key)
+            if cached_result:
+                results[audio_path.name] = cached_result
+                continue
+
+            if cache_key not in missed_names_by_key:
+                missed_names_by_key[cache_key] = []
+                missed_paths.append(audio_path)
+            missed_names_by_key[cache_key].append(audio_path.name)
+
+        logger.info(
+            f"Кэш транскрипций: {len(results)} попаданий, {len(missed_paths)} файлов на обработку"
         )
 
-        try:
-            transcription_options = self.whisper_config.transcribe_options.model_dump()
+        if missed_paths:
+            batch_results = self._transcribe_batch_splitting(
+                missed_paths, silence_duration_s
+            )
+            for cache_key, file_names in missed_names_by_key.items():
+                result = batch_results[file_names[0]]
+                self.cache.put(cache_key, result.text)
+                for file_name in file_names:
+                    results[file_name] = result
 
-            with SuppressStd(logger):
-                concat_transcribe_result, metrics["transcribe_time"] = (
-                    self._measured_call(
-                        lambda: self.whisper_model.transcribe(
-                            concat_audio_data, **transcription_options
-                        )
-                    )
-                )
+        return {audio_path.name: results[audio_path.name] for audio_path in audio_paths}
 
-                concat_aligned_result, metrics["align_time"] = self._measured_call(
-                    lambda: whisperx.align(
-                        concat_transcribe_result["segments"],
-                        self.align_model,
-                        self.align_metadata,
-                        concat_audio_data,
-                        self.align_config.device,
-                    )
-                )
+    def _transcribe_batch_splitting(
+        self, audio_paths: List[Path], silence_duration_s: float
+    ) -> Dict[str, TranscriptionResult]:
+        """transcribe_batch, который при нехватке памяти делит батч файлов пополам.
 
-                concat_segmentation_timeline, metrics["segmentation_time"] = (
-                    self._measured_call(
-                        lambda: self._perfom_segmentation(Path(concat_audio_path))
-                    )
-                )
+        Перед повтором выгружаются неиспользуемые модели и кэш CUDA, а batch_size
+        этапа, на котором не хватило памяти, уменьшается вдвое до конца процесса.
+        Один файл повторяется, только если его batch_size удалось уменьшить.
+        """
+        if not self.batch_tuning_config.split_on_oom:
+            return self._transcribe_batch(audio_paths, silence_duration_s)
 
-            decomposed_words = self._decompose_words(
-                original_files_info,
-                concat_aligned_result["segments"],
-                silence_duration_s,
-            )
-            decomposed_segments = self._decompose_segments(
-                original_files_info, concat_segmentation_timeline
+        try:
+            return self._transcribe_batch(audio_paths, silence_duration_s)
+        except Exception as error:
+            if not is_out_of_memory(error):
+                raise
+            shrunk = isinstance(error, BatchOutOfMemoryError) and (
+                SAFE_BATCH_SIZES.shrink(error.key, error.batch_size)
             )
-            processed_files = {
-                file_name: {"word_segments": words, "timeline": timeline}
-                for (file_name, words), (_, timeline) in zip(
-                    decomposed_words.items(),
-                    decomposed_segments.items(),
-                )
-            }
-
-            segments_by_file = {
-                file_name: self._assign_words_to_segments(
-                    file_info["word_segments"], file_info["timeline"]
-                )
-                for file_name, file_info in processed_files.items()
-            }
+            if len(audio_paths) == 1 and not shrunk:
+                raise
 
-            metrics_by_file = self._calculate_metrics_by_file(
-                original_files_info, metrics
+            middle = (len(audio_paths) + 1) // 2
+            parts = (
+                [audio_paths[:middle], audio_paths[middle:]]
+                if len(audio_paths) > 1
+                else [audio_paths]
+            )
+            logger.warning(
+                f"Нехватка памяти на батче из {len(audio_paths)} файлов ({error}), повтор частями {[len(part) for part in parts]}"
             )
 
-        finally:
-            Path(concat_audio_path).unlink(missing_ok=True)
+        # Вне except: трассировка ошибки больше не держит тензоры упавшего прохода
+        release_memory()
+        results: Dict[str, TranscriptionResult] = {}
+        for part in parts:
+            results.update(self._transcribe_batch_splitting(part, silence_duration_s))
+        return results
 
-        return {
-            file_name: TranscriptionResult(
-                text=TextFormatter.format_segments(segments),
-                metrics=metrics_by_file[file_name],
+    def _transcribe_batch(
+        self, audio_paths: List[Path], silence_duration_s: float = 2.0
+    ) -> Dict[str, TranscriptionResult]:
+        # Длинные файлы не склеиваются с остальными и не декодируются целиком
+        long_paths = [path for path in audio_paths if self._is_long(path)]
+        if not long_paths:
+            return self._transcribe_concat_batch(audio_paths, silence_duration_s)
+
+        results = {path.name: self.transcribe_long(path) for path in long_paths}
+        short_paths = [path for path in audio_paths if path not in long_paths]
+        if short_paths:
+            results.update(
+                self._transcribe_concat_batch(short_paths, silence_duration_s)
             )
-            for file_name, segments in segments_by_file.items()
-        }
+        return {path.name: results[path.name] for path in audio_paths}
 
-    def _create_concat_audio(
-        self, audio_paths: List[Path], silence_duration_s: float = 1.0
-    ) -> Tuple[Path, np.ndarray, List[Dict[str, Any]]]:
-        sample_rate = 16000
-        silence_array = np.zeros(
-            int(silence_duration_s * sample_rate), dtype=np.float32
-        )
-        original_files_info = []
-        all_audio_data = []
-        current_time_s = 0.0
-
-        for i, audio_path in enumerate(audio_paths):
-            try:
-                audio_data = whisperx.load_audio(str(audio_path))
-            except Exception as e:
-                logger.error(f"Failed to load audio file {audio_path}: {e}")
-                raise
+    def _transcribe_concat_batch(
+        self, audio_paths: List[Path], silence_duration_s: float
+    ) -> Dict[str, TranscriptionResult]:
+        start = time.monotonic()
+        packed = self.batch_config.mode == "vad_chunks"
+        # Упакованному ASR паузы между файлами не нужны: файлы берутся из общего буфера
+        if packed:
+            silence_duration_s = 0.0
+        silence_maps: Dict[str, SilenceMap] = {}
+
+        def compress(audio_path: Path, samples: np.ndarray) -> np.ndarray:
+            compressed, silence_maps[audio_path.name] = compress_silence(
+                samples, self.silence_config
+            )
+            return compressed
 
-            file_duration_s = librosa.get_duration(path=audio_path)
-            original_files_info.append(
-                {
-                    "path": audio_path,
-                    "duration_s": file_duration_s,
-                    "start_s_in_concat": current_time_s,
-                }
+        concat_audio = self.audio_loader.load_concat(
+            audio_paths,
+            silence_duration_s,
+            preprocess=compress if self.silence_config.enabled else None,
+        )
+        language_groups, detect_times = self._group_by_language(concat_audio)
+
+        results: Dict[str, TranscriptionResult] = {}
+        for language, indices in language_groups.items():
+            group_audio = (
+                concat_audio
+                if len(language_groups) == 1
+                else concat_audio.subset(indices, silence_duration_s)
             )
-            all_audio_data.append(audio_data)
-            current_time_s += file_duration_s
+            if packed:
+                group_results = self._transcribe_packed(
+                    group_audio, language, start, silence_maps
+                )
+            else:
+                group_results = self._transcribe_concat(
+                    group_audio, silence_duration_s, language, start, silence_maps
+                )
+            results.update(group_results)
 
-            if i < len(audio_paths) - 1:
-                all_audio_data.append(silence_array)
-                current_time_s += silence_duration_s
+        for file_name, detect_time in detect_times.items():
+            results[file_name].metrics.transcribe_time += detect_time
+        for file_name, silence_map in silence_maps.items():
+            results[file_name].metrics.saved_audio_s = silence_map.saved_s
 
-        concatenated_audio_data = np.concatenate(all_audio_data)
+        return {file_name: results[file_name] for file_name in concat_audio.file_names}
 
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmpfile:
-            concated_audio_path = tmpfile.name
+    def _group_by_language(
+        self, concat_audio: ConcatAudio
+    ) -> Tuple[Dict[str | None, List[int]], Dict[str, float]]:
+        """Группирует файлы батча по языку, чтобы каждая группа выравнивалась одной моделью за проход.
 
-        if concatenated_audio_data.dtype != np.float32:
-            concatenated_audio_data = concatenated_audio_data.astype(np.float32)
+        Без language_routing или при заданном языке Whisper группа одна.
+        """
+        all_files = list(range(len(concat_audio.file_names)))
+        if not self.align_config.language_routing or self.whisper_config.language:
+            return {self.whisper_config.language: all_files}, {}
+
+        groups: Dict[str | None, List[int]] = {}
+        detect_times: Dict[str, float] = {}
+        with SuppressStd(logger):
+            for index in all_files:
+                language, detect_times[concat_audio.file_names[index]] = (
+                    self._measured_call(
+                        lambda: self.whisper_model.detect_language(
+                            concat_audio.file_samples(index)
+                        )
+                    )
+                )
+                groups.setdefault(language, []).append(index)
 
-        scipy_wavfile.write(concated_audio_path, sample_rate, concatenated_audio_data)
+        logger.info(
+            f"Языки файлов батча: { {lang: len(files) for lang, files in groups.items()} }"
+        )
+        return groups, detect_times
 
-        return Path(concated_audio_path), concatenated_audio_data, original_files_info
+    def _transcribe_concat(
+        self,
+        concat_audio: ConcatAudio,
+        silence_duration_s: float,
+        language: str | None,
+        started_at: float,
+        silence_maps: Dict[str, SilenceMap],
+    ) -> Dict[str, TranscriptionResult]:
+        metrics: Dict[str, float] = {}
+        concat_audio_data = concat_audio.samples
+        transcription_options = self.whisper_config.transcribe_options.model_dump()
+        transcription_options["batch_size"] = self._whisper_batch_size(
+            len(concat_audio_data) / SAMPLE_RATE
+        )
 
-    def _adjust_time(self, audio_info, abs_start, abs_end):
-        file_start_s = audio_info["start_s_in_concat"]
+        with SuppressStd(logger):
+            segmentation_future = self._start_segmentation(
+                concat_audio, self._segment_files
+            )
 
-        relative_start = max(0, abs_start - file_start_s)
-        relative_end = min(audio_info["duration_s"], abs_end - file_start_s)
+            with self._oom_stage(
+                self._whisper_batch_key, transcription_options["batch_size"]
+            ):
+                concat_transcribe_result, metrics["transcribe_time"] = (
+                    self._measured_call(
+                        lambda: self.whisper_model.transcribe(
+                            concat_audio_data,
+                            language=language,
+                            **transcription_options,
+                        )
+                    )
+                )
+            language = language or concat_transcribe_result.get("language")
 
-        return relative_start, relative_end
+            segmentation_result, metrics["segmentation_time"] = (
+                self._finish_segmentation(
+                    concat_audio, segmentation_future, self._segment_files
+                )
+            )
+            concat_segmentation_timeline, timelines_by_file = segmentation_result
 
-    def _decompose_words(
-        self,
-        file_infos: List[Dict[str, Any]],
-        word_segments: List[SingleAlignedSegment],
-        silence_duration_s: float,
-    ) -> Dict[str, List[SingleWordSegment]]:
-        words_by_file: Dict[str, List[SingleWordSegment]] = {
-            info["path"].name: [] for info in file_infos
+            concat_aligned_segments, align_metrics = self._align_near_changes(
+                concat_transcribe_result["segments"],
+                concat_audio_data,
+                language,
+                concat_segmentation_timeline,
+            )
+            metrics.update(align_metrics)
+
+        file_names = concat_audio.file_names
+        file_starts = concat_audio.starts_s
+        file_durations = concat_audio.durations_s
+        decomposed_words = decompose_words(
+            file_names,
+            file_starts,
+            file_durations,
+            concat_aligned_segments,
+            silence_duration_s,
+        )
+        processed_files = {
+            file_name: {
+                "word_segments": words,
+                "timeline": timelines_by_file[file_name],
+            }
+            for file_name, words in decomposed_words.items()
         }
-        current_file_index = 0
-        for segment in word_segments:
-            abs_start = segment.get("start")
-            abs_end = segment.get("end")
-
-            while current_file_index < len(file_infos):
-                current_file_info = file_infos[current_file_index]
-                file_start_s = current_file_info["start_s_in_concat"]
-                file_end_s = file_start_s + current_file_info["duration_s"]
-
-                if current_file_index < len(file_infos) - 1:
-                    file_end_s += silence_duration_s * 0.5
-
-                if current_file_index > 0:
-                    file_start_s -= silence_duration_s * 0.5
-
-                if abs_end >= file_start_s and abs_start <= file_end_s:
-                    break
-
-                current_file_index += 1
-
-            current_file_info = file_infos[current_file_index]
-            file_name = current_file_info["path"].name
-            for word in segment["words"]:
-                adjusted_word = word.copy()
-                if "start" in word and "end" in word:
-                    adj_start, adj_end = self._adjust_time(
-                        current_file_info, word["start"], word["end"]
-                    )
-                    adjusted_word["start"] = adj_start
-                    adjusted_word["end"] = adj_end
 
-                words_by_file[file_name].append(adjusted_word)
+        segments_by_file = {
+            file_name: self._assign_words(
+                file_info["word_segments"],
+                file_info["timeline"],
+                silence_maps.get(file_name),
+            )
+            for file_name, file_info in processed_files.items()
+        }
 
-        return words_by_file
+        metrics["wall_time"] = time.monotonic() - started_at
+        metrics_by_file = self._calculate_metrics_by_file(concat_audio, metrics)
 
-    def _decompose_segments(
-        self, file_infos: List[Dict[str, Any]], segments_timeline: Timeline
-    ) -> Dict[str, Timeline]:
-        segments_by_file: Dict[str, List[Segment]] = {
-            info["path"].name: [] for info in file_infos
+        return {
+            file_name: TranscriptionResult(
+                text=TextFormatter.format_segments(segments),
+                metrics=metrics_by_file[file_name],
+                language=language,
+            )
+            for file_name, segments in segments_by_file.items()
         }
 
-        for segment_event in segments_timeline.segments_list_:
-            abs_start_event, abs_end_event = segment_event.start, segment_event.end
+    def _transcribe_packed(
+        self,
+        concat_audio: ConcatAudio,
+        language: str | None,
+        started_at: float,
+        silence_maps: Dict[str, SilenceMap],
+    ) -> Dict[str, TranscriptionResult]:
+        """Batch-режим batch_config.mode == "vad_chunks".
 
-            for file_info in file_infos:
-                if abs_start_event >= abs_end_event:  # Сегмент полностью обработан
-                    break
+        ASR идет общими батчами из кусков речи всех файлов, сегментация - общими
+        батчами окон по каждому файлу, выравнивание - по каждому файлу. Все
+        результаты сразу в шкале своего файла.
+        """
+        metrics: Dict[str, float] = {}
+        file_names = concat_audio.file_names
+        file_audios = [
+            concat_audio.file_samples(index) for index in range(len(file_names))
+        ]
 
-                file_name = file_info["path"].name
-                file_start_s = file_info["start_s_in_concat"]
-                file_end_s = file_start_s + file_info["duration_s"]
+        with SuppressStd(logger):
+            segmentation_future = self._start_segmentation(
+                concat_audio, self._segment_files
+            )
 
-                # Вычисляем часть сегмента, которая пересекается с текущим файлом
-                overlap_start_abs = max(abs_start_event, file_start_s)
-                overlap_end_abs = min(abs_end_event, file_end_s)
+            batch_size = self._whisper_batch_size(
+                sum(len(audio) for audio in file_audios) / SAMPLE_RATE
+            )
 
-                if (
-                    overlap_start_abs < overlap_end_abs
-                ):  # Если есть реальное пересечение
-                    # Корректируем времена относительно текущего файла
-                    adj_start, adj_end = self._adjust_time(
-                        file_info, overlap_start_abs, overlap_end_abs
+            def transcribe() -> List[List[Dict[str, Any]]]:
+                nonlocal language
+                if language is None:
+                    language = self.whisper_model.detect_language(
+                        max(file_audios, key=len)
                     )
+                return transcribe_packed(
+                    self.whisper_model,
+                    file_audios,
+                    language,
+                    batch_size,
+                    self.batch_config.chunk_size_s,
+                )
 
-                    if adj_end - adj_start > 0.3:
-                        segments_by_file[file_name].append(Segment(adj_start, adj_end))
+            with self._oom_stage(self._whisper_batch_key, batch_size):
+                segments_by_file, metrics["transcribe_time"] = self._measured_call(
+                    transcribe
+                )
+
+            segmentation_result, metrics["segmentation_time"] = (
+                self._finish_segmentation(
+                    concat_audio, segmentation_future, self._segment_files
+                )
+            )
+            _, timelines_by_file = segmentation_result
 
-                # Для следующего файла часть сегмента начинается с конца этого пересечения
-                abs_start_event = overlap_end_abs
+            metrics["align_time"] = 0.0
+            aligned_fractions = []
+            words_by_file = {}
+            for file_name, file_audio, segments in zip(
+                file_names, file_audios, segments_by_file
+            ):
+                aligned_segments, align_metrics = self._align_near_changes(
+                    segments, file_audio, language, timelines_by_file[file_name]
+                )
+                metrics["align_time"] += align_metrics["align_time"]
+                aligned_fractions.append(align_metrics["aligned_fraction"])
+                words_by_file[file_name] = [
+                    word for segment in aligned_segments for word in segment["words"]
+                ]
+        metrics["aligned_fraction"] = float(np.mean(aligned_fractions))
+
+        segments_by_file = {
+            file_name: self._assign_words(
+                words_by_file[file_name],
+                timelines_by_file[file_name],
+                silence_maps.get(file_name),
+            )
+            for file_name in file_names
+        }
 
-        file_timelines = {}
-        for file_name, segments in segments_by_file.items():
-            file_timelines[file_name] = Timeline(segments=segments)
+        metrics["wall_time"] = time.monotonic() - started_at
+        metrics_by_file = self._calculate_metrics_by_file(concat_audio, metrics)
 
-        return file_timelines
+        return {
+            file_name: TranscriptionResult(
+                text=TextFormatter.format_segments(segments),
+                metrics=metrics_by_file[file_name],
+                language=language,
+            )
+            for file_name, segments in segments_by_file.items()
+        }
 
     def _calculate_metrics_by_file(
         self,
-        original_files_info: List[Dict[str, Any]],
+        concat_audio: ConcatAudio,
         total_metrics: Dict[str, float],
     ) -> Dict[str, TranscriptionMetrics]:
         metrics_by_file: Dict[str, TranscriptionMetrics] = {}
-        total_audio_duration_no_silence = sum(
-            info["duration_s"] for info in original_files_info
+        file_durations = concat_audio.durations_s
+        total_audio_duration_no_silence = file_durations.sum()
+        proportions = (
+            file_durations / total_audio_duration_no_silence
+            if total_audio_duration_no_silence > 0
+            else np.zeros_like(file_durations)
         )
 
-        for info in original_files_info:
-            file_duration_no_silence = info["duration_s"]
-            proportion = (
-                file_duration_no_silence / total_audio_duration_no_silence
-                if total_audio_duration_no_silence > 0
-                else 0
-            )
-
+        for file_name, proportion, decode_time in zip(
+            concat_audio.file_names, proportions, concat_audio.layout["decode_time"]
+        ):
             file_specific_metrics = {
+                "decode_time": float(decode_time),
                 "transcribe_time": total_metrics.get("transcribe_time", 0) * proportion,
                 "align_time": total_metrics.get("align_time", 0) * proportion,
                 "segmentation_time": total_metrics.get("segmentation_time", 0)
                 * proportion,
+                "wall_time": total_metrics.get("wall_time", 0) * proportion,
+                "aligned_fraction": total_metrics.get("aligned_fraction", 1.0),
             }
-            metrics_by_file[info["path"].name] = TranscriptionMetrics(
-                file_specific_metrics
-            )
+            metrics_by_file[file_name] = TranscriptionMetrics(file_specific_metrics)
 
         return metrics_by_file
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+whisperx_alignment = pytest.importorskip("whisperx.alignment")
+
+from whisper_model.alignment import _ctc_backtrack, _ctc_trellis  # noqa: E402
+
+BLANK_ID = 0
+NUM_CLASSES = 12
+
+
+def random_batch(rng, batch_size):
+    """Эмиссии и токены батча сегментов разной длины, дополненные как в align_batched."""
+    num_frames = rng.integers(3, 60, size=batch_size)
+    num_tokens = np.array([rng.integers(1, frames + 3) for frames in num_frames])
+    logits = rng.normal(size=(batch_size, num_frames.max(), NUM_CLASSES))
+    emissions = torch.log_softmax(torch.from_numpy(logits).float(), dim=-1).numpy()
+
+    tokens = np.full((batch_size, num_tokens.max()), BLANK_ID, dtype=np.int64)
+    for i, count in enumerate(num_tokens):
+        tokens[i, :count] = rng.integers(1, NUM_CLASSES, size=count)
+    return emissions, tokens, num_frames, num_tokens
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_ctc_matches_whisperx_reference(seed):
+    rng = np.random.default_rng(seed)
+    emissions, tokens, num_frames, num_tokens = random_batch(rng, batch_size=8)
+
+    trellis = _ctc_trellis(emissions, tokens, num_frames, num_tokens, BLANK_ID)
+    starts, ends, scores, failed = _ctc_backtrack(
+        trellis, emissions, tokens, num_frames, num_tokens, BLANK_ID
+    )
+
+    for i in range(len(emissions)):
+        frames, count = num_frames[i], num_tokens[i]
+        emission = torch.from_numpy(emissions[i, :frames])
+        segment_tokens = tokens[i, :count].tolist()
+
+        expected_trellis = whisperx_alignment.get_trellis(
+            emission, segment_tokens, BLANK_ID
+        )
+        np.testing.assert_allclose(
+            trellis[i, : frames + 1, : count + 1],
+            expected_trellis.numpy(),
+            rtol=1e-5,
+            atol=1e-4,
+        )
+
+        path = whisperx_alignment.backtrack(
+            expected_trellis, emission, segment_tokens, BLANK_ID
+        )
+        assert failed[i] == (path is None)
+        if path is None:
+            continue
+
+        merged = whisperx_alignment.merge_repeats(
+            path, [str(t) for t in segment_tokens]
+        )
+        assert starts[i, :count].tolist() == [segment.start for segment in merged]
+        assert ends[i, :count].tolist() == [segment.end for segment in merged]
+        np.testing.assert_allclose(
+            scores[i, :count], [segment.score for segment in merged], rtol=1e-5
+        )
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from whisper_model.audio import SAMPLE_RATE, AudioLoader, compress_silence
+from whisper_model.config import AudioConfig, SilenceConfig
+
+CONFIG = SilenceConfig(
+    enabled=True, threshold_db=-40, frame_s=0.02, max_pause_s=1.0, edge_padding_s=0.2
+)
+
+
+def build_audio(rng, layout):
+    """Запись из кусков (длительность, есть ли речь): речь - шум, тишина - нули.
+
+    Речь - случайный шум, поэтому сдвинутое отображение времен не совпадет
+    с исходной записью по сэмплам.
+    """
+    pieces = []
+    for duration_s, speech in layout:
+        num_samples = round(duration_s * SAMPLE_RATE)
+        if speech:
+            pieces.append(rng.uniform(0.1, 0.5, num_samples).astype(np.float32))
+        else:
+            pieces.append(np.zeros(num_samples, dtype=np.float32))
+    return np.concatenate(pieces)
+
+
+def assert_maps_back(samples, compressed, silence_map):
+    times = np.arange(len(compressed)) / SAMPLE_RATE
+    original_index = np.round(silence_map.to_original(times) * SAMPLE_RATE).astype(int)
+    np.testing.assert_array_equal(samples[original_index], compressed)
+
+
+def test_compress_silence_trims_edges_and_long_pauses():
+    rng = np.random.default_rng(0)
+    samples = build_audio(
+        rng, [(0.5, False), (1.0, True), (3.0, False), (1.0, True), (0.6, False)]
+    )
+
+    compressed, silence_map = compress_silence(samples, CONFIG)
+
+    # По краям остается edge_padding_s, от паузы - max_pause_s
+    assert silence_map.compressed_duration_s == pytest.approx(0.2 + 1 + 1 + 1 + 0.2)
+    assert silence_map.original_duration_s == pytest.approx(6.1)
+    assert silence_map.saved_s == pytest.approx(2.7)
+    assert len(compressed) / SAMPLE_RATE == pytest.approx(
+        silence_map.compressed_duration_s
+    )
+    assert_maps_back(samples, compressed, silence_map)
+
+
+def test_compress_silence_keeps_short_pauses():
+    rng = np.random.default_rng(1)
+    samples = build_audio(rng, [(1.0, True), (0.5, False), (1.0, True)])
+
+    compressed, silence_map = compress_silence(samples, CONFIG)
+
+    np.testing.assert_array_equal(compressed, samples)
+    times = np.linspace(0, silence_map.compressed_duration_s, 50)
+    np.testing.assert_allclose(silence_map.to_original(times), times)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_compress_silence_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    layout = [
+        (round(rng.uniform(0.1, 3.0), 2), index % 2 == int(seed % 2))
+        for index in range(int(rng.integers(1, 10)))
+    ]
+    samples = build_audio(rng, layout)
+
+    compressed, silence_map = compress_silence(samples, CONFIG)
+
+    assert len(compressed) <= len(samples)
+    assert silence_map.compressed_duration_s == pytest.approx(
+        len(compressed) / SAMPLE_RATE
+    )
+    assert_maps_back(samples, compressed, silence_map)
+    # Шкала сжатой записи монотонно переходит в исходную
+    times = np.linspace(0, silence_map.compressed_duration_s, 200)
+    assert np.all(np.diff(silence_map.to_original(times)) > 0)
+
+
+@pytest.mark.parametrize("stretch", [1, 3])
+def test_load_concat_places_files_between_silences(tmp_path, stretch):
+    rng = np.random.default_rng(0)
+    files = [rng.uniform(-0.5, 0.5, n).astype(np.float32) for n in (16000, 8000, 24000)]
+    paths = []
+    for i, file_samples in enumerate(files):
+        path = tmp_path / f"file{i}.wav"
+        sf.write(path, file_samples, SAMPLE_RATE, subtype="FLOAT")
+        paths.append(path)
+
+    # stretch > 1 удлиняет файлы после декодирования, и буфер по заголовкам приходится растить
+    concat = AudioLoader(AudioConfig(decoder="soundfile")).load_concat(
+        paths, 0.5, preprocess=lambda _, samples: np.tile(samples, stretch)
+    )
+
+    silence = np.zeros(SAMPLE_RATE // 2, dtype=np.float32)
+    expected = np.concatenate(
+        [np.tile(files[0], stretch)]
+        + [
+            part
+            for samples in files[1:]
+            for part in (silence, np.tile(samples, stretch))
+        ]
+    )
+    np.testing.assert_array_equal(concat.samples, expected)
+    assert concat.file_names == ["file0.wav", "file1.wav", "file2.wav"]
+    for i, samples in enumerate(files):
+        np.testing.assert_array_equal(concat.file_samples(i), np.tile(samples, stretch))
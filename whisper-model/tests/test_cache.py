@@ -0,0 +1,111 @@
+import json
+
+from whisper_model.cache import TranscriptionCache
+from whisper_model.config import CacheConfig
+
+DIGEST = "config"
+
+
+def entry_size(text):
+    return len(json.dumps({"text": text}, ensure_ascii=False).encode("utf-8"))
+
+
+def test_memory_lru_evicts_least_recently_used():
+    cache = TranscriptionCache(CacheConfig(enabled=True, memory_max_entries=2), DIGEST)
+
+    cache.put("a", "текст a")
+    cache.put("b", "текст b")
+    # Обращение к a делает b самой старой записью
+    assert cache.get("a") == "текст a"
+    cache.put("c", "текст c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "текст a"
+    assert cache.get("c") == "текст c"
+    stats = cache.stats
+    assert (stats.hits, stats.memory_hits, stats.misses) == (3, 3, 1)
+
+
+def test_memory_disabled_with_zero_entries():
+    cache = TranscriptionCache(CacheConfig(enabled=True, memory_max_entries=0), DIGEST)
+
+    cache.put("a", "текст")
+
+    assert cache.get("a") is None
+
+
+def test_disk_hit_after_memory_eviction(tmp_path):
+    config = CacheConfig(enabled=True, memory_max_entries=1, disk_path=tmp_path)
+    cache = TranscriptionCache(config, DIGEST)
+
+    cache.put("a", "текст a")
+    cache.put("b", "текст b")
+
+    assert cache.get("a") == "текст a"
+    stats = cache.stats
+    assert (stats.disk_hits, stats.memory_hits) == (1, 0)
+    # Прочитанная с диска запись снова в памяти
+    assert cache.get("a") == "текст a"
+    assert cache.stats.memory_hits == 1
+
+
+def test_disk_size_cap_evicts_oldest_entries(tmp_path):
+    size = entry_size("текст 0")
+    config = CacheConfig(
+        enabled=True, memory_max_entries=0, disk_path=tmp_path, disk_max_bytes=3 * size
+    )
+    cache = TranscriptionCache(config, DIGEST)
+
+    for i in range(3):
+        cache.put(f"k{i}", f"текст {i}")
+    # Чтение k0 освежает запись, вытесняется k1
+    assert cache.get("k0") == "текст 0"
+    cache.put("k3", "текст 3")
+
+    assert cache.stats.disk_bytes == 3 * size
+    assert sorted(path.stem for path in tmp_path.glob("*.json")) == ["k0", "k2", "k3"]
+    assert cache.get("k1") is None
+    assert cache.get("k2") == "текст 2"
+
+
+def test_disk_skips_entry_larger_than_cap(tmp_path):
+    config = CacheConfig(
+        enabled=True, memory_max_entries=0, disk_path=tmp_path, disk_max_bytes=10
+    )
+    cache = TranscriptionCache(config, DIGEST)
+
+    cache.put("a", "слишком длинный текст")
+
+    assert cache.stats.disk_bytes == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_disk_index_restored_on_restart(tmp_path):
+    size = entry_size("текст 0")
+    config = CacheConfig(
+        enabled=True, memory_max_entries=0, disk_path=tmp_path, disk_max_bytes=2 * size
+    )
+    cache = TranscriptionCache(config, DIGEST)
+    cache.put("k0", "текст 0")
+    cache.put("k1", "текст 1")
+
+    restarted = TranscriptionCache(config, DIGEST)
+
+    assert restarted.stats.disk_bytes == 2 * size
+    assert restarted.get("k1") == "текст 1"
+    restarted.put("k2", "текст 2")
+    assert restarted.stats.disk_bytes == 2 * size
+    assert sorted(path.stem for path in tmp_path.glob("*.json")) == ["k1", "k2"]
+
+
+def test_key_depends_on_content_and_config(tmp_path):
+    first = tmp_path / "first.oga"
+    second = tmp_path / "second.oga"
+    first.write_bytes(b"voice")
+    second.write_bytes(b"voice")
+    cache = TranscriptionCache(CacheConfig(enabled=True), DIGEST)
+
+    assert cache.key(first) == cache.key(second)
+    assert cache.key(first) != TranscriptionCache(CacheConfig(), "other").key(first)
+    first.write_bytes(b"other voice")
+    assert cache.key(first) != cache.key(second)
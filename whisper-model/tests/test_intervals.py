@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+from pyannote.core import Segment, Timeline
+
+from whisper_model.intervals import assign_words_to_segments, decompose_segments
+
+
+def reference_assign(words, timeline):
+    """Поэлементная версия правила из docstring assign_words_to_segments.
+
+    Слово попадает в первый сегмент, конец которого не раньше конца слова,
+    слова после конца шкалы - в последний сегмент, слова без метки времени -
+    в сегмент предыдущего размеченного слова. Порядок слов не нарушается.
+    """
+    segment_ends = [segment.end for segment in timeline]
+    groups = []
+    current_index = 0
+    for word in words:
+        if word.get("end") is not None:
+            index = next(
+                (i for i, end in enumerate(segment_ends) if end >= word["end"]),
+                len(segment_ends) - 1,
+            )
+            current_index = max(current_index, index)
+        if groups and groups[-1][0] == current_index:
+            groups[-1][1].append(word)
+        else:
+            groups.append((current_index, [word]))
+    return [group for _, group in groups]
+
+
+def reference_decompose(file_names, file_starts, file_durations, timeline, min_piece_s):
+    """Пересечение каждого сегмента с каждым файлом, как в старом цикле по файлам."""
+    file_timelines = {}
+    for name, file_start, duration in zip(file_names, file_starts, file_durations):
+        file_end = file_start + duration
+        pieces = []
+        for segment in timeline:
+            start = max(segment.start, file_start)
+            end = min(segment.end, file_end)
+            if end - start > min_piece_s:
+                pieces.append((start - file_start, end - file_start))
+        file_timelines[name] = pieces
+    return file_timelines
+
+
+def random_timeline(rng, duration_s, count):
+    bounds = np.sort(rng.uniform(0, duration_s, size=2 * count))
+    return Timeline(
+        segments=[Segment(float(a), float(b)) for a, b in bounds.reshape(-1, 2)]
+    )
+
+
+def random_words(rng, duration_s, count, untimed_fraction):
+    bounds = np.sort(rng.uniform(0, duration_s, size=2 * count)).reshape(-1, 2)
+    words = []
+    for i, (start, end) in enumerate(bounds):
+        word = {"word": f"w{i}", "start": float(start), "end": float(end)}
+        draw = rng.random()
+        if draw < untimed_fraction / 2:
+            word["end"] = None
+        elif draw < untimed_fraction:
+            del word["start"], word["end"]
+        words.append(word)
+    return words
+
+
+def test_assign_words_empty_inputs():
+    timeline = Timeline(segments=[Segment(0, 1)])
+    words = [{"word": "a", "start": 0.1, "end": 0.2}]
+
+    assert assign_words_to_segments([], timeline) == []
+    assert assign_words_to_segments(words, Timeline()) == [words]
+
+
+def test_assign_words_after_timeline_end_stay_in_last_segment():
+    timeline = Timeline(segments=[Segment(0, 1), Segment(1, 2)])
+    words = [
+        {"word": "a", "start": 0.2, "end": 0.5},
+        {"word": "b", "start": 1.2, "end": 1.5},
+        {"word": "c", "start": 2.5, "end": 3.0},
+    ]
+
+    assert assign_words_to_segments(words, timeline) == [words[:1], words[1:]]
+
+
+def test_assign_untimed_words_follow_previous_word():
+    timeline = Timeline(segments=[Segment(0, 1), Segment(1, 2)])
+    words = [
+        {"word": "a"},
+        {"word": "b", "start": 0.2, "end": 0.5},
+        {"word": "c", "start": 1.2, "end": None},
+        {"word": "d", "start": 1.2, "end": 1.5},
+        {"word": "e"},
+    ]
+
+    assert assign_words_to_segments(words, timeline) == [words[:3], words[3:]]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_assign_words_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    timeline = random_timeline(rng, 60, int(rng.integers(1, 15)))
+    words = random_words(rng, 65, int(rng.integers(1, 80)), untimed_fraction=0.2)
+
+    assert assign_words_to_segments(words, timeline) == reference_assign(
+        words, timeline
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_decompose_segments_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    durations = rng.uniform(0.5, 20, size=int(rng.integers(1, 8)))
+    silence_s = 2.0
+    starts = np.concatenate(([0.0], np.cumsum(durations + silence_s)[:-1]))
+    names = [f"file{i}.oga" for i in range(len(durations))]
+    timeline = random_timeline(
+        rng, starts[-1] + durations[-1], int(rng.integers(0, 30))
+    )
+
+    result = decompose_segments(names, starts, durations, timeline, min_piece_s=0.3)
+    expected = reference_decompose(names, starts, durations, timeline, 0.3)
+
+    assert list(result) == names
+    for name in names:
+        pieces = [(segment.start, segment.end) for segment in result[name]]
+        assert pieces == pytest.approx(expected[name])
@@ -0,0 +1,164 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from whisper_model import registry as registry_module  # noqa: E402
+from whisper_model.registry import ModelRegistry, registry_key  # noqa: E402
+
+MB = 2**20
+
+
+class FakeModel:
+    def __init__(self, name, size_bytes):
+        self.name = name
+        self.size_bytes = size_bytes
+
+
+@pytest.fixture(autouse=True)
+def fake_model_size(monkeypatch):
+    """Размер модели берется из FakeModel, а не из параметров torch."""
+    monkeypatch.setattr(
+        registry_module, "estimate_model_bytes", lambda model: model.size_bytes
+    )
+
+
+class Loader:
+    def __init__(self, name, size_bytes):
+        self.name = name
+        self.size_bytes = size_bytes
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return FakeModel(self.name, self.size_bytes)
+
+
+def key(name):
+    return registry_key("model", {"name": name})
+
+
+def loaded(registry):
+    """Ключи моделей, оставшихся в реестре, в виде stats()."""
+    return set(registry.stats())
+
+
+def names(*model_names):
+    return {f"model:{key(name)[1]}" for name in model_names}
+
+
+def test_registry_key_ignores_dict_order():
+    assert registry_key("align", {"a": 1, "b": 2}) == registry_key(
+        "align", {"b": 2, "a": 1}
+    )
+    assert registry_key("align", {"a": 1}) != registry_key("segmentation", {"a": 1})
+
+
+def test_acquire_shares_loaded_model():
+    registry = ModelRegistry()
+    loader = Loader("a", MB)
+
+    first = registry.acquire(key("a"), loader)
+    second = registry.acquire(key("a"), loader)
+
+    assert first is second
+    assert loader.calls == 1
+    assert registry.stats()[f"model:{key('a')[1]}"] == {
+        "refcount": 2,
+        "size_bytes": MB,
+    }
+
+
+def test_release_keeps_idle_model_until_unload():
+    registry = ModelRegistry()
+    loader = Loader("a", MB)
+    registry.acquire(key("a"), loader)
+    registry.acquire(key("a"), loader)
+
+    registry.release(key("a"), unload=True)
+    # Модель еще используется - unload не выгружает
+    registry.unload(key("a"))
+    assert registry.used_bytes == MB
+
+    registry.release(key("a"))
+    assert registry.used_bytes == MB
+    registry.acquire(key("a"), loader)
+    assert loader.calls == 1
+
+    registry.release(key("a"), unload=True)
+    assert registry.used_bytes == 0
+    registry.acquire(key("a"), loader)
+    assert loader.calls == 2
+
+
+def test_release_of_unknown_key_is_ignored():
+    registry = ModelRegistry()
+
+    registry.release(key("a"))
+    registry.unload(key("a"))
+
+    assert registry.stats() == {}
+
+
+def test_idle_models_evicted_in_lru_order_over_budget():
+    registry = ModelRegistry(budget_bytes=3 * MB)
+    loaders = {name: Loader(name, MB) for name in "abcd"}
+    for name in "abc":
+        registry.acquire(key(name), loaders[name])
+        registry.release(key(name))
+    # Обращение к a делает b самой давней
+    registry.acquire(key("a"), loaders["a"])
+    registry.release(key("a"))
+
+    registry.acquire(key("d"), loaders["d"])
+
+    assert registry.used_bytes == 3 * MB
+    assert loaded(registry) == names(*"acd")
+
+
+def test_models_in_use_are_not_evicted():
+    registry = ModelRegistry(budget_bytes=2 * MB)
+    registry.acquire(key("a"), Loader("a", 2 * MB))
+    registry.acquire(key("b"), Loader("b", 2 * MB))
+
+    # Бюджет превышен, но обе модели используются
+    assert registry.used_bytes == 4 * MB
+
+    registry.release(key("a"))
+    assert loaded(registry) == names("b")
+
+
+def test_set_budget_evicts_idle_models():
+    registry = ModelRegistry()
+    for name in "ab":
+        registry.acquire(key(name), Loader(name, MB))
+        registry.release(key(name))
+
+    registry.set_budget(MB)
+
+    assert loaded(registry) == names("b")
+
+
+def test_clear_unloads_only_idle_models():
+    registry = ModelRegistry()
+    registry.acquire(key("a"), Loader("a", MB))
+    registry.acquire(key("b"), Loader("b", MB))
+    registry.release(key("b"))
+
+    registry.clear()
+
+    assert loaded(registry) == names("a")
+
+
+def test_failed_load_is_not_cached():
+    registry = ModelRegistry()
+
+    def failing_loader():
+        raise RuntimeError("нет файла модели")
+
+    with pytest.raises(RuntimeError):
+        registry.acquire(key("a"), failing_loader)
+    assert registry.stats() == {}
+
+    loader = Loader("a", MB)
+    registry.acquire(key("a"), loader)
+    assert loader.calls == 1